@@ -0,0 +1,81 @@
+"""
+fitting.py - least-squares fits of many independent curves at once, for the simulate_* scripts
+
+This work by Justin Kunimune is marked with CC0 1.0 Universal.
+To view a copy of this license, visit <https://creativecommons.org/publicdomain/zero/1.0>
+"""
+import numpy as np
+
+
+def fit_linear(basis, y):
+	# fit y ≈ basis@params in the least-squares sense.  basis is (N, P), and y is either (N,) or (N, K) for K independent
+	# curves, which all get solved in one lstsq.  like curve_fit, it returns the params and their covariances, which are
+	# (P,) and (P, P) for one curve or (P, K) and (K, P, P) for several
+	basis, y = np.asarray(basis, dtype=float), np.asarray(y, dtype=float)
+	scale = np.sqrt(np.sum(basis**2, axis=0)) # normalize the columns like polyfit does, for conditioning
+	scale[scale == 0] = 1
+	params, _, _, _ = np.linalg.lstsq(basis/scale, y, rcond=None)
+	params = params/(scale if y.ndim == 1 else scale[:, np.newaxis])
+	residuals = y - basis@params
+	variance = np.sum(residuals**2, axis=0)/max(1, y.shape[0] - basis.shape[1])
+	inverse = np.linalg.pinv(basis.T@basis)
+	covariance = inverse*np.expand_dims(variance, (-2, -1))
+	return params, covariance
+
+
+def fit_curves(f, x, y, p0, max_iterations=200, tolerance=1e-10):
+	# fit y ≈ f(x, *params) for one curve (y is (N,)) or for K independent curves at once (y is (N, K)) with a vectorized
+	# Levenberg–Marquardt-damped Gauss–Newton iteration.  f must broadcast, since it gets called with x as an (N, 1) column
+	# and each param as a (1, K) row.  p0 is (P,), or (P, K) for a separate guess for each curve.  it returns the params
+	# and covariances in the same shapes as fit_linear()
+	x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+	single = y.ndim == 1
+	if single:
+		y = y[:, np.newaxis]
+	num_points, num_curves = y.shape
+	p = np.array(np.broadcast_to(np.reshape(p0, (len(p0), -1)), (len(p0), num_curves)), dtype=float)
+	num_params = p.shape[0]
+
+	def model(p):
+		return np.broadcast_to(f(x[:, np.newaxis], *p[:, np.newaxis, :]), y.shape)
+
+	def jacobian(p, f_p): # by forward differences, one param at a time for all the curves together
+		J = np.empty((num_curves, num_points, num_params))
+		for i in range(num_params):
+			step = np.sqrt(np.finfo(float).eps)*np.maximum(abs(p[i]), 1)
+			p_step = p.copy()
+			p_step[i] += step
+			J[:, :, i] = ((model(p_step) - f_p)/step).T
+		return J
+
+	f_p = model(p)
+	cost = np.sum((y - f_p)**2, axis=0)
+	damping = np.full(num_curves, 1e-3)
+	active = np.ones(num_curves, dtype=bool)
+	for iteration in range(max_iterations):
+		J = jacobian(p, f_p)
+		JTJ = np.einsum('knp,knq->kpq', J, J)
+		JTr = np.einsum('knp,nk->kp', J, y - f_p)
+		diagonal = np.einsum('kpp->kp', JTJ)
+		system = JTJ + (damping[:, np.newaxis]*np.maximum(diagonal, 1e-30))[:, :, np.newaxis]*np.eye(num_params)
+		step = np.linalg.solve(system, JTr[:, :, np.newaxis])[:, :, 0].T
+		p_new = np.where(active, p + step, p)
+		f_new = model(p_new)
+		cost_new = np.sum((y - f_new)**2, axis=0)
+		better = active & (cost_new <= cost)
+		converged = better & (cost - cost_new <= tolerance*cost) & (np.max(abs(step), axis=0) <= np.sqrt(tolerance)*(np.max(abs(p), axis=0) + np.sqrt(tolerance)))
+		p[:, better] = p_new[:, better] # take the steps that helped and dampen the ones that didn't
+		f_p = np.where(better, f_new, f_p)
+		cost = np.where(better, cost_new, cost)
+		damping = np.where(better, damping/10, damping*10)
+		active &= ~converged & (damping < 1e16)
+		if not np.any(active):
+			break
+
+	J = jacobian(p, f_p)
+	inverse = np.linalg.pinv(np.einsum('knp,knq->kpq', J, J))
+	covariance = inverse*(cost/max(1, num_points - num_params))[:, np.newaxis, np.newaxis]
+	if single:
+		return p[:, 0], covariance[0]
+	else:
+		return p, covariance
@@ -2,10 +2,22 @@
 This work by Justin Kunimune is marked with CC0 1.0 Universal.
 To view a copy of this license, visit <https://creativecommons.org/publicdomain/zero/1.0>
 """
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from scipy.special import jv, jn_zeros
-import scipy.optimize as opt
+from scipy.ndimage import label, binary_dilation
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from concurrent.futures import ProcessPoolExecutor
+
+from fitting import fit_linear
 
 MODE = 'toroid'
 PARAM_SWEEP = np.linspace(1, 3.5, 101)
@@ -15,144 +27,679 @@ MAX_ASPECT_RATIO = 4.0
 BOUNDARY_EXCESS = 3
 EIGEN_RES = 40
 INTEGRATION_RES = 8
+QUADRATURE = 'gauss' # 'gauss' to smooth the basis with Gauss-Legendre quadrature (and exact integrals where possible), or 'uniform' to average it on an even sub-grid
+COMPARE_QUADRATURES = False # whether to print the error of each quadrature rule before starting
+MULTIGRID_LEVELS = [] # resolutions of coarser grids on which to solve first, coarsest first (or empty to solve only at RES)
+WORKERS = 1 # number of processes among which to split the parameter sweep
+REDISTRIBUTION = 'swap' # 'swap' to trade cells along the edge according to potential, or 'equipotential' to fill in an equipotential with fractional cells at the edge
+EQUIPOTENTIAL_BISECTIONS = 40 # number of bisection steps to take when searching for the equipotential
+EQUIPOTENTIAL_TOLERANCE = 1e-2 # when filling in equipotentials, stop once no cell's occupancy changes by more than this
+EQUIPOTENTIAL_REACH = 0.2 # when filling in equipotentials, the farthest (in the same units as α_0) that the surface can move in one iteration
+BATCHED = False # whether to relax all of the planets together, stacked into one array, instead of one at a time
+COMPARE_BATCH = False # whether to check before starting that a batch mixing ellipsoids and toroids matches solving each one alone
+WARM_START = False # whether to seed each solve with the previous converged shape instead of a fresh ellipse or torus
+INCREMENTAL = False # whether to update the spectral coefficients using only the cells that changed since the last iteration
+FULL_RECOMPUTE_INTERVAL = 16 # when incremental, redo the full transform this often to keep roundoff from accumulating
+HEADLESS = False # whether to skip all interactive plotting (so that it can run unattended on a server)
+FRAME_INTERVAL = 0 # save every this many iterations of each solve (or 0 to save none)
+FRAME_FORMAT = 'png' # 'png' to save the frames as images, or 'npz' to save the arrays themselves
+FRAME_DIRECTORY = 'gravity_frames' # directory in which to save the frames (and, if headless, the final plots)
+
+SOLVER = 'eigen' # 'eigen' to compute the potential with the eigenbasis, or 'poisson' to solve a sparse finite-difference Poisson equation
+COMPARE_SOLVERS = False # whether to print the time and discrepancy of each solver before starting
+TRANSFORM = 'separable' # 'separable' to store the radial and axial factors of the eigenfunctions separately, or 'dense' to store them multiplied out
+BASIS_CACHE = 'gravity_basis' # directory in which to store the eigenbasis between runs
+BASIS_ARRAYS = {'dense': ['B', 'PB', 'Λ'], 'separable': ['Bρ', 'PBρ', 'Bz', 'Λ']}[TRANSFORM]
+PRECISION = 'float64' # the floating point type in which to store the basis and do the transforms ('float32' halves the memory)
+MEMORY_BUDGET = 2**30 # maximum number of bytes to use at once when building or applying the dense basis (or None to do all the modes at once)
+REPORT_MEMORY = False # whether to track and print the peak memory usage of the main process
+RESULTS_FILE = 'gravity_results.csv' # file to which to append each solution as soon as it's found
+RESUME = False # whether to skip the parameter values already in the results file rather than starting it over
+ANALYZE_ONLY = False # whether to skip the solving and just fit the results already in the results file
+SAVE_PLANETS = False # whether to also save each final planet shape, in a directory next to the results file
+RESULT_COLUMNS = ['α_0', 'ρ_min', 'ρ_max', 'z_max', 'ω', 'g_out', 'iterations']
 
 ρB = 1.1*MAX_ASPECT_RATIO
 zB = 1.1
 z_inf = zB*BOUNDARY_EXCESS
 ρ_inf = ρB + (z_inf - zB)
 
-ρ_mesh = np.linspace(0, ρB, int(MAX_ASPECT_RATIO*RES)+1) # radial coordinate
-z_mesh = np.linspace(0, zB, int(RES)+1) # axial coordinate
-dρ, dz = ρ_mesh[1], z_mesh[1]
-ρ, z = ρ_mesh[:-1]+dρ/2, z_mesh[:-1]+dz/2
-P, Z = np.meshgrid(ρ, z)
-ρ_in_pixel = np.linspace(-dρ/2, dρ/2, INTEGRATION_RES+1)[:-1] + dρ/INTEGRATION_RES/2 # radial coordinate
-z_in_pixel = np.linspace(-dz/2, dz/2, INTEGRATION_RES+1)[:-1] + dz/INTEGRATION_RES/2 # axial coordinate
-P_in_pixel, Z_in_pixel = np.meshgrid(ρ_in_pixel, z_in_pixel)
-n_in_pixel = P_in_pixel.size
-
-print("sana baze")
-
-max_n = int(EIGEN_RES*ρ_inf/z_inf) # for relevant ns and ms
-max_m = int(EIGEN_RES)
-J_zeros = jn_zeros(0, max_n)
-B = np.empty((max_n*max_m, *P.shape)) # create a basis matrix (each layer is an eigenfunction)
-PB = np.empty((max_n*max_m, *P.shape)) # and one weighted by radius (each layer is rho times an eigenfunction)
-Λ = np.empty((max_n*max_m)) # store the corresponding eigenvalues
-for n in range(0, max_n):
-	for m in range(0, max_m):
-		kn = J_zeros[n]/ρ_inf # choose a wavenumber
-		km = (m+1/2)*np.pi/z_inf
-		P_fine = P[:,:,np.newaxis,np.newaxis] + P_in_pixel[np.newaxis,np.newaxis,:,:] # make sure the eigenfunctions are properly smoothed
-		Z_fine = Z[:,:,np.newaxis,np.newaxis] + Z_in_pixel[np.newaxis,np.newaxis,:,:]
-		Ψnm = jv(0, kn*P_fine) * np.cos(km*Z_fine)
-		norm = np.sqrt(ρ_inf**2/2*jv(1, kn*ρ_inf)**2 * z_inf/2)
-		B[n*max_m+m, :,:] = np.mean(Ψnm, axis=(2,3))/norm
-		PB[n*max_m+m, :,:] = np.mean(P_fine*Ψnm, axis=(2,3))/norm
-		Λ[n*max_m+m] = kn**2 + km**2
-
-print("iterating over angular velocities")
-
-rotation_parameters = []
-aspect_ratios, elongations = [], []
-for α_0 in PARAM_SWEEP: # angular momentum
-	print("solving for equilibrium: {}".format(α_0))
 
-	planet = np.zeros(P.shape) # initialize a spherical/toral planet
-	if MODE == 'ellipsoid':
-		planet[np.hypot(P/α_0, Z) < 1] = 1
-	elif MODE == 'toroid':
-		planet[np.hypot(P-α_0, Z) < 1] = 1
+def load_basis(grid):
+	key = basis_key(grid)
+	directory = os.path.join(BASIS_CACHE, hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16])
+	try: # see if we've already computed this basis
+		with open(os.path.join(directory, 'key.json'), 'r') as key_file:
+			stale = json.load(key_file) != key
+	except (FileNotFoundError, ValueError):
+		stale = True
+	if stale: # if not (or if the parameters have changed since), compute it and save it
+		os.makedirs(directory, exist_ok=True)
+		compute_basis(grid, lambda name, shape: np.lib.format.open_memmap( # write it directly to disk so that it never has to fit in memory all at once
+			os.path.join(directory, f'{name}.npy'), mode='w+', dtype=PRECISION, shape=shape))
+		with open(os.path.join(directory, 'key.json'), 'w') as key_file: # write the key last so that an interrupted save looks stale
+			json.dump(key, key_file)
+	return tuple(np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in BASIS_ARRAYS) # map it from disk rather than reading it in
+
+
+def basis_key(grid):
+	return dict(
+		RES=grid.res, EIGEN_RES=grid.eigen_res, INTEGRATION_RES=INTEGRATION_RES, QUADRATURE=QUADRATURE,
+		MAX_ASPECT_RATIO=MAX_ASPECT_RATIO, BOUNDARY_EXCESS=BOUNDARY_EXCESS, TRANSFORM=TRANSFORM, PRECISION=PRECISION)
+
+
+def compute_basis(grid, allocate):
+	kn, km = wavenumbers(grid)
+	norm = np.sqrt(ρ_inf**2/2*jv(1, kn*ρ_inf)**2 * z_inf/2)[:,np.newaxis]
+	Bρ, PBρ, Bz = cell_averages(grid, kn, km, QUADRATURE, INTEGRATION_RES) # make sure the eigenfunctions are properly smoothed
+	Bρ, PBρ = Bρ/norm, PBρ/norm
+	if TRANSFORM == 'separable': # the eigenfunctions are products of a radial and an axial part, so we only need to store those
+		allocate('Bρ', Bρ.shape)[:] = Bρ # the radial parts (each row is a Bessel function)
+		allocate('PBρ', PBρ.shape)[:] = PBρ # and weighted by radius
+		allocate('Bz', Bz.shape)[:] = Bz # the axial parts (each row is a cosine)
+		allocate('Λ', (km.size, kn.size))[:] = km[:,np.newaxis]**2 + kn[np.newaxis,:]**2 # and the eigenvalues (indexed [m, n])
 	else:
-		raise Exception()
+		B = allocate('B', (kn.size*km.size, *grid.P.shape)) # create a basis matrix (each layer is an eigenfunction)
+		PB = allocate('PB', (kn.size*km.size, *grid.P.shape)) # and one weighted by radius (each layer is rho times an eigenfunction)
+		Λ = allocate('Λ', (kn.size*km.size,)) # store the corresponding eigenvalues
+		for block in mode_blocks(kn.size*km.size, 2*grid.P.nbytes): # do a bunch of modes at a time
+			n, m = np.divmod(np.arange(block.start, block.stop), km.size)
+			B[block, :,:] = Bz[m,:,np.newaxis]*Bρ[n,np.newaxis,:]
+			PB[block, :,:] = Bz[m,:,np.newaxis]*PBρ[n,np.newaxis,:]
+			Λ[block] = kn[n]**2 + km[m]**2
 
-	for i in range(int(MAX_ASPECT_RATIO*RES)):
-		A = np.sum(PB*planet[np.newaxis, :, :]*dρ*dz, axis=(1,2)) # fourier transform
-		planet_twiddle = np.sum(B*A[:, np.newaxis, np.newaxis], axis=0)
 
-		ɸ = np.sum(B*(A/Λ)[:, np.newaxis, np.newaxis], axis=0) # compute the potential
-		g = np.linalg.norm(np.gradient(ɸ, z, ρ), axis=0)
-		if MODE == 'ellipsoid':
-			ɸ_in = ɸ[np.nonzero(planet[:,0])[0], 0][np.argmax(Z[np.nonzero(planet[:,0])[0], 0])]
-		else:
-			ɸ_in = ɸ[0, np.nonzero(planet[0,:])[0]][np.argmin(P[0, np.nonzero(planet[0,:])[0]])]
-		ɸ_out = ɸ[0, np.nonzero(planet[0,:])[0]][np.argmax(P[0, np.nonzero(planet[0,:])[0]])]
-		g_out = g[0, np.nonzero(planet[0,:])[0]][np.argmax(P[0, np.nonzero(planet[0,:])[0]])]
-
-		ρ_min = P[np.nonzero(planet)].min() - dρ/2
-		ρ_max = P[np.nonzero(planet)].max() + dρ/2
-		z_max = Z[np.nonzero(planet)].max() + dz/2
-		ω = np.sqrt(max(0, 2*(ɸ_in - ɸ_out)/((ρ_max-dρ/2)**2 - (ρ_min+dρ/2)**2)))
-		ɸ += P**2*ω**2/2 # introduce the effective rotational potential
-
-		plt.clf() # do an interim plot
-		plt.pcolormesh(ρ_mesh, z_mesh, planet)
-		plt.colorbar()
-		plt.contour(ρ, z, ɸ, levels=12, colors='w')
-		plt.axis('equal')
-		plt.pause(1/60)
-
-		edge = np.nonzero(np.linalg.norm(planet+np.gradient(planet), axis=0)) # redistribute the mass within the planet and adjacent spaces
-		hierarchy = np.argsort(-ɸ[edge]) # but this way is a little stabler, and I think a little faster TODO what if I find an equipotential for real each time
-		cutoff = int(np.sum(planet[edge]))
-		if np.all(planet[edge[0][hierarchy[:cutoff]],edge[1][hierarchy[:cutoff]]] == 1): # terminal condition A:
-			break # if this changes absolutely noting, break
-		planet[edge[0][hierarchy[:cutoff]],edge[1][hierarchy[:cutoff]]] = 1 # WHEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
-		planet[edge[0][hierarchy[cutoff:]],edge[1][hierarchy[cutoff:]]] = 0 # EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
+def wavenumbers(grid):
+	max_n = int(grid.eigen_res*ρ_inf/z_inf) # for relevant ns and ms
+	max_m = int(grid.eigen_res)
+	kn = jn_zeros(0, max_n)/ρ_inf
+	km = (np.arange(max_m)+1/2)*np.pi/z_inf
+	return kn, km
+
+
+def cell_averages(grid, kn, km, quadrature, order):
+	if quadrature == 'uniform': # either sample each cell evenly
+		nodes = (2*np.arange(order) + 1)/order - 1
+		weights = np.full(order, 1/order)
+	elif quadrature == 'gauss': # or at the Gauss-Legendre nodes
+		nodes, weights = np.polynomial.legendre.leggauss(order)
+		weights = weights/2
+	else:
+		raise ValueError(f"unrecognized quadrature: '{quadrature}'")
+	ρ_fine = grid.ρ[:,np.newaxis] + nodes*grid.dρ/2
+	z_fine = grid.z[:,np.newaxis] + nodes*grid.dz/2
+	J = jv(0, kn[:,np.newaxis,np.newaxis]*ρ_fine) @ weights # the radial parts (each row is a Bessel function)
+	if quadrature == 'gauss': # where the integrals have closed forms, use them instead
+		PJ = np.diff(grid.ρ_mesh*jv(1, kn[:,np.newaxis]*grid.ρ_mesh), axis=1)/(kn[:,np.newaxis]*grid.dρ)
+		C = np.diff(np.sin(km[:,np.newaxis]*grid.z_mesh), axis=1)/(km[:,np.newaxis]*grid.dz)
+	else:
+		PJ = (ρ_fine*jv(0, kn[:,np.newaxis,np.newaxis]*ρ_fine)) @ weights # the radial parts weighted by radius
+		C = np.cos(km[:,np.newaxis,np.newaxis]*z_fine) @ weights # the axial parts (each row is a cosine)
+	return J, PJ, C
+
+
+def compare_quadratures(grid):
+	kn, km = wavenumbers(grid)
+	reference = cell_averages(grid, kn, km, 'gauss', 4*INTEGRATION_RES) # this should be converged to roundoff
+	brute_force = cell_averages(grid, kn, km, 'uniform', INTEGRATION_RES)
+	print("the current {0}×{0} average is off by {1:.2e}".format(
+		INTEGRATION_RES, max(np.max(abs(a - b)) for a, b in zip(brute_force, reference))))
+	for quadrature in ['uniform', 'gauss']:
+		for order in range(1, INTEGRATION_RES + 1):
+			averages = cell_averages(grid, kn, km, quadrature, order)
+			print("{0} quadrature with {1}×{1} points per cell is off by {2:.2e} ({3:.2e} from the current average)".format(
+				quadrature, order,
+				max(np.max(abs(a - b)) for a, b in zip(averages, reference)),
+				max(np.max(abs(a - b)) for a, b in zip(averages, brute_force))))
+
+
+def mode_blocks(num_modes, bytes_per_mode):
+	if MEMORY_BUDGET is None:
+		block_size = num_modes
+	else:
+		block_size = max(1, int(MEMORY_BUDGET//bytes_per_mode))
+	for start in range(0, num_modes, block_size):
+		yield slice(start, min(start + block_size, num_modes))
+
+
+def transform(planet, grid, basis):
+	if TRANSFORM == 'separable': # with the separable basis this is just two small matrix products
+		Bρ, PBρ, Bz, Λ = basis
+		return Bz @ planet @ PBρ.T*grid.dρ*grid.dz
+	else:
+		B, PB, Λ = basis
+		A = np.empty((*planet.shape[:-2], PB.shape[0]), dtype=PB.dtype)
+		for block in mode_blocks(PB.shape[0], PB[0].nbytes): # go a few modes at a time so that only those need to be paged in
+			A[..., block] = np.tensordot(planet, PB[block], axes=([-2, -1], [1, 2]))*grid.dρ*grid.dz
+		return A
+
+
+def partial_transform(cells, values, grid, basis):
+	rows, cols = cells
+	if TRANSFORM == 'separable': # this is a rank-k update, where k is the number of cells
+		Bρ, PBρ, Bz, Λ = basis
+		return Bz[:, rows] @ (values[:, np.newaxis]*PBρ[:, cols].T)*grid.dρ*grid.dz
+	else:
+		B, PB, Λ = basis
+		return PB[:, rows, cols] @ values*grid.dρ*grid.dz
+
+
+def inverse_transform(A, basis):
+	if TRANSFORM == 'separable':
+		Bρ, PBρ, Bz, Λ = basis
+		return Bz.T @ A @ Bρ
+	else:
+		B, PB, Λ = basis
+		field = np.zeros((*A.shape[:-1], *B.shape[1:]), dtype=B.dtype)
+		for block in mode_blocks(B.shape[0], B[0].nbytes):
+			field += np.tensordot(A[..., block], B[block], axes=1)
+		return field
 
-		if np.any(np.nonzero(planet[:,-1])): # terminal condition B:
+
+def potential(planet, grid, solver):
+	if SOLVER == 'poisson':
+		return poisson_potential(planet, grid, solver)
+	else:
+		return eigen_potential(planet, grid, solver)
+
+
+def eigen_potential(planet, grid, basis):
+	return inverse_transform(transform(planet, grid, basis)/basis[-1], basis)
+
+
+def poisson_potential(planet, grid, solver):
+	factorization, shape = solver
+	source = np.zeros((*planet.shape[:-2], *shape)) # pad it out to the edge of the extended grid
+	source[..., :grid.z.size, :grid.ρ.size] = planet
+	ɸ = factorization.solve(source.reshape((-1, shape[0]*shape[1])).T).T.reshape(source.shape)
+	return ɸ[..., :grid.z.size, :grid.ρ.size].astype(planet.dtype)
+
+
+def factorize_poisson(grid):
+	nρ = int(round(ρ_inf/grid.dρ)) # extend the grid out to the same boundaries as the eigenbasis
+	nz = int(round(z_inf/grid.dz))
+	ρ_centers = (np.arange(nρ) + 1/2)*grid.dρ
+	ρ_faces = np.arange(nρ + 1)*grid.dρ
+	inner = ρ_faces[:-1]/(ρ_centers*grid.dρ**2) # discretize -1/ρ d/dρ (ρ dɸ/dρ) as a finite volume
+	outer = ρ_faces[1:]/(ρ_centers*grid.dρ**2)
+	diagonal = inner + outer
+	diagonal[-1] += outer[-1] # ɸ = 0 at the outer boundary
+	Lρ = sparse.diags([-inner[1:], diagonal, -outer[:-1]], [-1, 0, 1])
+	diagonal = np.full(nz, 2/grid.dz**2) # discretize -d^2ɸ/dz^2
+	diagonal[0] = 1/grid.dz**2 # dɸ/dz = 0 at the midplane
+	diagonal[-1] = 3/grid.dz**2 # ɸ = 0 at the top boundary
+	Lz = sparse.diags([np.full(nz - 1, -1/grid.dz**2), diagonal, np.full(nz - 1, -1/grid.dz**2)], [-1, 0, 1])
+	L = sparse.kron(Lz, sparse.identity(nρ)) + sparse.kron(sparse.identity(nz), Lρ)
+	return splu(L.tocsc()), (nz, nρ) # factorize it once so that each solve is just a back-substitution
+
+
+def compare_solvers(grid):
+	α_0 = np.median(PARAM_SWEEP)
+	planet = initial_planet(MODE, α_0, grid)
+	potentials = {}
+	for solver_type, prepare, solve in [('eigen', load_basis, eigen_potential), ('poisson', factorize_poisson, poisson_potential)]:
+		start = time.perf_counter()
+		solver = prepare(grid)
+		setup_time = time.perf_counter() - start
+		start = time.perf_counter()
+		for i in range(10):
+			potentials[solver_type] = solve(planet, grid, solver)
+		solve_time = (time.perf_counter() - start)/10
+		print("the {} solver took {:.3f} s to set up and {:.2e} s per solve".format(solver_type, setup_time, solve_time))
+	print("they differ by up to {:.2%} of the peak potential".format(
+		np.max(abs(potentials['poisson'] - potentials['eigen']))/np.max(abs(potentials['eigen']))))
+
+
+def compare_batch(levels):
+	α_0 = np.median(PARAM_SWEEP)
+	modes = ['ellipsoid', 'toroid']
+	mixed = solve_batch(modes, [α_0, α_0], levels)
+	for mode, result in zip(modes, mixed): # compare each one to the unbatched solver
+		alone = solve_equilibrium(α_0, levels, plot=False, mode=mode)
+		batched, unbatched = np.array(result[:5]), np.array(alone[:5])
+		discrepancy = max(abs(result[-1] - alone[-1]).max(), np.max(np.where( # (a failure in only one of them shows up as nan)
+			np.isnan(batched) & np.isnan(unbatched), 0, abs(batched - unbatched))))
+		print("the mixed batch's {} differs from the lone one by {:.2e}".format(mode, discrepancy))
+
+
+def sweep(levels, completed):
+	seed = None
+	if WARM_START: # when resuming, continue from the last stored shape (which is only there if SAVE_PLANETS was on)
+		for α_0 in PARAM_SWEEP:
+			if α_0 not in completed:
+				break
+			ρ_min, ρ_max, z_max, ω, g_out, iterations, planet = completed[α_0]
+			if not np.isnan(ρ_min): # (skipping the failures, like solve_all() does)
+				seed = (α_0, planet, levels[-1][0]) if planet is not None else None
+	solutions = solve_all([α_0 for α_0 in PARAM_SWEEP if α_0 not in completed], levels, seed)
+	try:
+		for α_0 in PARAM_SWEEP:
+			if α_0 in completed: # use the stored results where we have them
+				yield completed[α_0]
+			else: # and solve (and store) the rest
+				result = next(solutions)
+				record_result(α_0, result)
+				yield result
+	finally:
+		solutions.close()
+
+
+def solve_all(α_0s, levels, seed=None):
+	if BATCHED: # either solve them all together
+		yield from solve_batch([MODE]*len(α_0s), α_0s, levels)
+	elif WORKERS <= 1 or WARM_START: # or one at a time (which continuation requires)
+		for α_0 in α_0s:
+			result = solve_equilibrium(α_0, levels, plot=not HEADLESS, seed=seed)
+			if WARM_START and not np.isnan(result[0]): # pass each converged shape on to the next one
+				seed = (α_0, result[-1], levels[-1][0])
+			yield result
+	else: # or hand them out to a pool of processes, each of which maps the bases from disk for itself
+		with ProcessPoolExecutor(WORKERS, initializer=initialize_worker) as executor:
+			try:
+				yield from executor.map(solve_equilibrium_in_worker, α_0s) # the results come back in order, so the caller can still stop at the first one that fails
+			finally:
+				executor.shutdown(cancel_futures=True) # don't bother finishing the rest if the caller stopped early
+
+
+def initialize_worker():
+	global worker_levels
+	worker_levels = prepare_levels()
+
+
+def solve_equilibrium_in_worker(α_0):
+	return solve_equilibrium(α_0, worker_levels, plot=False)
+
+
+def solve_equilibrium(α_0, levels, plot, seed=None, mode=MODE):
+	print("solving for equilibrium: {}".format(α_0))
+	for grid, solver in levels: # solve it on each grid in turn, from coarsest to finest
+		result = relax(α_0, grid, solver, plot, seed, mode)
+		if np.isnan(result[0]): # if it failed on a coarse grid, start over on the next one rather than trusting it
+			seed = None
+		else: # otherwise use it as the starting point for the next one
+			seed = (α_0, result[-1], grid)
+	return result
+
+
+def relax(α_0, grid, solver, plot, seed, mode):
+	if seed is not None: # start from the last solution, stretched or shifted to match this angular momentum
+		planet = resample_planet(*seed, α_0, grid, mode)
+	else: # or initialize a spherical/toral planet
+		planet = initial_planet(mode, α_0, grid)
+
+	last_planet = planet.copy() # the planet as of the last transform, for the incremental updates
+	iterations = 0
+	for i in range(int(MAX_ASPECT_RATIO*grid.res)):
+		iterations += 1
+		if SOLVER == 'poisson': # either solve for the potential on the grid
+			ɸ = potential(planet, grid, solver)
+		else: # or use the eigenbasis
+			if not INCREMENTAL or i%FULL_RECOMPUTE_INTERVAL == 0:
+				A = transform(planet, grid, solver) # fourier transform
+			else: # or just add in the contribution of the cells that flipped
+				flipped = np.nonzero(planet != last_planet)
+				A = A + partial_transform(flipped, planet[flipped] - last_planet[flipped], grid, solver)
+			last_planet = planet.copy()
+
+			ɸ = inverse_transform(A/solver[-1], solver) # compute the potential
+		g = np.linalg.norm(np.gradient(ɸ, grid.z, grid.ρ), axis=0)
+		ρ_min, ρ_max, z_max, ω, g_out = measure(planet, ɸ, g, mode, grid)
+		ɸ += grid.P**2*ω**2/2 # introduce the effective rotational potential
+
+		if plot:
+			plt.clf() # do an interim plot
+			plt.pcolormesh(grid.ρ_mesh, grid.z_mesh, planet)
+			plt.colorbar()
+			plt.contour(grid.ρ, grid.z, ɸ, levels=12, colors='w')
+			plt.axis('equal')
+			plt.pause(1/60)
+		if FRAME_INTERVAL > 0 and i%FRAME_INTERVAL == 0:
+			save_frame(mode, α_0, i, planet, ɸ, grid)
+
+		outcome = redistribute(planet, ɸ, mode, grid)
+		if outcome == 'converged': # terminal condition A:
+			break # if this changes absolutely noting, break
+		elif outcome == 'boundary': # terminal condition B:
 			ρ_min, ρ_max, z_max = np.nan, np.nan, np.nan # if it has hit the boundary, break
 			break
-		if MODE == 'toroid' and np.any(np.nonzero(planet[:,0])):
+		elif outcome == 'collapsed':
 			ρ_min = np.nan # if it is a torus and collapsed into a sphere, break
 			break
 
-	if np.isnan(ρ_min): # let us know how it went
-		print("xibay")
+	print("took {} iterations at resolution {}".format(iterations, grid.res))
+	return ρ_min, ρ_max, z_max, ω, g_out, iterations, planet
+
+
+def solve_batch(modes, α_0s, levels):
+	print("solving for {} equilibria at once".format(len(α_0s)))
+	seeds = [None]*len(α_0s)
+	for grid, solver in levels: # solve them all on each grid in turn, from coarsest to finest
+		results = relax_batch(modes, α_0s, grid, solver, seeds)
+		seeds = [None if np.isnan(result[0]) else (α_0, result[-1], grid) for α_0, result in zip(α_0s, results)]
+	return results
+
+
+def relax_batch(modes, α_0s, grid, solver, seeds):
+	planets = np.stack([ # stack all the planets along a batch dimension
+		initial_planet(mode, α_0, grid) if seed is None else resample_planet(*seed, α_0, grid, mode)
+		for mode, α_0, seed in zip(modes, α_0s, seeds)])
+	measurements = [None]*len(α_0s)
+	iterations = np.zeros(len(α_0s), dtype=int)
+	active = np.full(len(α_0s), True)
+	for i in range(int(MAX_ASPECT_RATIO*grid.res)):
+		batch = np.nonzero(active)[0] # only bother with the ones that haven't finished yet
+		if batch.size == 0:
+			break
+		iterations[batch] += 1
+
+		ɸ = potential(planets[batch], grid, solver) # compute all the potentials at once
+		g = np.linalg.norm(np.gradient(ɸ, grid.z, grid.ρ, axis=(1, 2)), axis=0)
+
+		for k, index in enumerate(batch): # then measure and redistribute each one
+			ρ_min, ρ_max, z_max, ω, g_out = measure(planets[index], ɸ[k], g[k], modes[index], grid)
+			outcome = redistribute(planets[index], ɸ[k] + grid.P**2*ω**2/2, modes[index], grid)
+			if outcome == 'boundary':
+				ρ_min, ρ_max, z_max = np.nan, np.nan, np.nan
+			elif outcome == 'collapsed':
+				ρ_min = np.nan
+			measurements[index] = (ρ_min, ρ_max, z_max, ω, g_out)
+			if outcome is not None: # it stops under the same conditions as in relax()
+				active[index] = False
+
+	print("took {} iterations at resolution {}".format(iterations.sum(), grid.res))
+	return [(*measurements[index], iterations[index], planets[index]) for index in range(len(α_0s))]
+
+
+def initial_planet(mode, α_0, grid):
+	planet = np.zeros(grid.P.shape, dtype=PRECISION)
+	if mode == 'ellipsoid':
+		planet[np.hypot(grid.P/α_0, grid.Z) < 1] = 1
+	elif mode == 'toroid':
+		planet[np.hypot(grid.P-α_0, grid.Z) < 1] = 1
+	else:
+		raise Exception()
+	return planet
+
+
+def measure(planet, ɸ, g, mode, grid):
+	P, Z, dρ, dz = grid.P, grid.Z, grid.dρ, grid.dz
+	solid = planet >= 1/2 # count the cells that are at least half full (which, for swap, is all of them)
+	if mode == 'ellipsoid':
+		ɸ_in = ɸ[np.nonzero(solid[:,0])[0], 0][np.argmax(Z[np.nonzero(solid[:,0])[0], 0])]
+	else:
+		ɸ_in = ɸ[0, np.nonzero(solid[0,:])[0]][np.argmin(P[0, np.nonzero(solid[0,:])[0]])]
+	ɸ_out = ɸ[0, np.nonzero(solid[0,:])[0]][np.argmax(P[0, np.nonzero(solid[0,:])[0]])]
+	g_out = g[0, np.nonzero(solid[0,:])[0]][np.argmax(P[0, np.nonzero(solid[0,:])[0]])]
+
+	ρ_min = P[np.nonzero(solid)].min() - dρ/2
+	ρ_max = P[np.nonzero(solid)].max() + dρ/2
+	z_max = Z[np.nonzero(solid)].max() + dz/2
+	ω = np.sqrt(max(0, 2*(ɸ_in - ɸ_out)/((ρ_max-dρ/2)**2 - (ρ_min+dρ/2)**2)))
+	return ρ_min, ρ_max, z_max, ω, g_out
+
+
+def redistribute(planet, ɸ, mode, grid):
+	if REDISTRIBUTION == 'equipotential': # either fill in the equipotential that holds all of the mass
+		new_planet = fill_equipotential(planet, ɸ, grid)
+		if np.all(abs(new_planet - planet) < EQUIPOTENTIAL_TOLERANCE):
+			return 'converged'
+		planet[:] = new_planet
+		return check_boundaries(planet, mode)
+
+	edge = np.nonzero(np.linalg.norm(planet+np.gradient(planet), axis=0)) # or redistribute the mass within the planet and adjacent spaces
+	hierarchy = np.argsort(-ɸ[edge]) # but this way is a little stabler, and I think a little faster
+	cutoff = int(np.sum(planet[edge]))
+	if np.all(planet[edge[0][hierarchy[:cutoff]],edge[1][hierarchy[:cutoff]]] == 1):
+		return 'converged'
+	planet[edge[0][hierarchy[:cutoff]],edge[1][hierarchy[:cutoff]]] = 1 # WHEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
+	planet[edge[0][hierarchy[cutoff:]],edge[1][hierarchy[cutoff:]]] = 0 # EEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
+	return check_boundaries(planet, mode)
+
+
+def check_boundaries(planet, mode):
+	if np.any(planet[:,-1] >= 1/2): # (slivers of fractional mass don't count)
+		return 'boundary'
+	if mode == 'toroid' and np.any(planet[:,0] >= 1/2):
+		return 'collapsed'
+	return None
+
+
+def fill_equipotential(planet, ɸ, grid):
+	mass = np.sum(planet)
+	δɸ = np.maximum(np.hypot(*np.gradient(ɸ)), 1e-15) # the amount the potential changes across each cell
+	reach = max(1, round(EQUIPOTENTIAL_REACH/min(grid.dρ, grid.dz))) # the cells to which mass can move this iteration
+	nearby = binary_dilation(planet > 0, iterations=reach)
+	def fill(level): # fill everything above the given level, with fractional occupancy where it crosses a cell
+		occupancy = np.where(nearby, np.clip((ɸ - level)/δɸ + 1/2, 0, 1), 0)
+		regions, num_regions = label(occupancy > 0)
+		attached = np.isin(regions, regions[(planet > 0) & (occupancy > 0)]) # and don't let it fill regions that aren't attached to the current planet
+		return np.where(attached, occupancy, 0)
+	low, high = np.min(ɸ), np.max(ɸ)
+	for i in range(EQUIPOTENTIAL_BISECTIONS): # do a bisection search for the level that conserves mass
+		level = (low + high)/2
+		if np.sum(fill(level)) > mass:
+			low = level
+		else:
+			high = level
+	return fill((low + high)/2).astype(planet.dtype)
+
+
+def save_frame(mode, α_0, i, planet, ɸ, grid):
+	os.makedirs(FRAME_DIRECTORY, exist_ok=True)
+	filename = os.path.join(FRAME_DIRECTORY, f'{mode}_{α_0:.4f}_{grid.res}_{i:03d}')
+	if FRAME_FORMAT == 'npz':
+		np.savez(filename + '.npz', planet=planet, potential=ɸ)
+	elif FRAME_FORMAT == 'png': # use a bare Figure so that this doesn't touch the interactive backend (and works in worker processes)
+		fig = Figure()
+		ax = fig.add_subplot()
+		fig.colorbar(ax.pcolormesh(grid.ρ_mesh, grid.z_mesh, planet))
+		ax.contour(grid.ρ, grid.z, ɸ, levels=12, colors='w')
+		ax.axis('equal')
+		fig.savefig(filename + '.png')
+	else:
+		raise ValueError(f"unrecognized frame format: '{FRAME_FORMAT}'")
+
+
+def resample_planet(α_old, planet, old_grid, α_new, new_grid, mode):
+	if mode == 'ellipsoid': # stretch it radially, the same way the initial ellipses differ
+		ρ_old = new_grid.ρ*α_old/α_new
+	elif mode == 'toroid': # shift it radially, the same way the initial tori differ
+		ρ_old = new_grid.ρ - (α_new - α_old)
+	else:
+		raise Exception()
+	i = np.maximum(0, np.floor(ρ_old/old_grid.dρ).astype(int)) # then find the old cell that each new cell falls in
+	j = np.floor(new_grid.z/old_grid.dz).astype(int)
+	inside = i < old_grid.ρ.size
+	new_planet = np.zeros(new_grid.P.shape, dtype=PRECISION)
+	new_planet[:, inside] = planet[j[:, np.newaxis], i[np.newaxis, inside]]
+	return new_planet
+
+
+def start_results():
+	with open(RESULTS_FILE, 'w', encoding='utf8') as file:
+		file.write('# ' + json.dumps(results_key()) + '\n')
+		file.write(','.join(RESULT_COLUMNS) + '\n')
+	return {}
+
+
+def load_results():
+	try:
+		with open(RESULTS_FILE, 'r', encoding='utf8') as file:
+			*lines, tail = file.read().split('\n') # (if the file doesn't end in a newline, the tail got cut off while writing)
+	except FileNotFoundError:
+		return start_results()
+	try:
+		key = json.loads(lines[0][2:])
+	except (IndexError, ValueError):
+		key = None
+	if key is None or len(lines) < 2: # if it got cut off before the header was even written, it's as good as absent
+		return start_results()
+	if key != results_key():
+		raise ValueError(f"{RESULTS_FILE} was made with different settings; move it out of the way or turn off RESUME")
+	completed = {}
+	good_lines = lines[:2]
+	for line in lines[2:]:
+		try:
+			α_0, ρ_min, ρ_max, z_max, ω, g_out, iterations = (float(value) for value in line.split(','))
+		except ValueError:
+			print(f"skipping the malformed line '{line}'")
+			continue
+		planet_filename = results_planet_filename(α_0)
+		planet = np.load(planet_filename) if os.path.isfile(planet_filename) else None
+		completed[α_0] = (ρ_min, ρ_max, z_max, ω, g_out, int(iterations), planet)
+		good_lines.append(line)
+	if tail != '' or len(good_lines) < len(lines): # cut out anything malformed so that new results don't get appended onto it
+		if tail != '':
+			print(f"skipping the unfinished line '{tail}'")
+		with open(RESULTS_FILE + '.tmp', 'w', encoding='utf8') as file:
+			file.write(''.join(line + '\n' for line in good_lines))
+		os.replace(RESULTS_FILE + '.tmp', RESULTS_FILE)
+	return completed
+
+
+def record_result(α_0, result):
+	ρ_min, ρ_max, z_max, ω, g_out, iterations, planet = result
+	if SAVE_PLANETS: # save the shape first so that any planet in the file is sure to be there
+		os.makedirs(os.path.dirname(results_planet_filename(α_0)), exist_ok=True)
+		np.save(results_planet_filename(α_0), planet)
+	with open(RESULTS_FILE, 'a', encoding='utf8') as file:
+		file.write(','.join(repr(float(value)) for value in [α_0, ρ_min, ρ_max, z_max, ω, g_out]) + f',{iterations}\n')
+		file.flush()
+		os.fsync(file.fileno()) # make sure it's actually on disk in case we crash right after this
+
+
+def results_planet_filename(α_0):
+	return os.path.join(os.path.splitext(RESULTS_FILE)[0] + '_planets', f'{float(α_0)!r}.npy')
+
+
+def results_key():
+	return dict(
+		MODE=MODE, SOLVER=SOLVER, RES=RES, MULTIGRID_LEVELS=MULTIGRID_LEVELS, EIGEN_RES=EIGEN_RES, INTEGRATION_RES=INTEGRATION_RES,
+		QUADRATURE=QUADRATURE, MAX_ASPECT_RATIO=MAX_ASPECT_RATIO, BOUNDARY_EXCESS=BOUNDARY_EXCESS, PRECISION=PRECISION,
+		WARM_START=WARM_START, REDISTRIBUTION=REDISTRIBUTION, EQUIPOTENTIAL_BISECTIONS=EQUIPOTENTIAL_BISECTIONS,
+		EQUIPOTENTIAL_TOLERANCE=EQUIPOTENTIAL_TOLERANCE, EQUIPOTENTIAL_REACH=EQUIPOTENTIAL_REACH)
+
+
+def generate_grids():
+	return [Grid(res) for res in MULTIGRID_LEVELS + [RES]]
+
+
+def prepare_levels():
+	if SOLVER == 'poisson':
+		return [(grid, factorize_poisson(grid)) for grid in generate_grids()]
 	else:
-		print("win")
-	if np.isnan(ρ_max): # and stop trying if it's hitting the walls
-		break
-	rotation_parameters.append(ρ_max*ω**2/g_out)
+		return [(grid, load_basis(grid)) for grid in generate_grids()]
+
+
+def main():
+	if HEADLESS:
+		plt.switch_backend('Agg')
+	if REPORT_MEMORY:
+		tracemalloc.start()
+
+	if COMPARE_QUADRATURES:
+		compare_quadratures(Grid(RES))
+	if COMPARE_SOLVERS:
+		compare_solvers(Grid(RES))
+
+	if ANALYZE_ONLY: # either just fit the results from last time
+		completed = load_results()
+		results = (completed[α_0] for α_0 in PARAM_SWEEP if α_0 in completed)
+	else: # or solve for them now
+		print("sana baze")
+
+		levels = prepare_levels()
+		if REPORT_MEMORY:
+			print("peak memory while loading the basis: {:.1f} MB (plus {:.1f} MB mapped from disk)".format(
+				tracemalloc.get_traced_memory()[1]/1e6, sum(array.nbytes for grid, solver in levels for array in solver if SOLVER == 'eigen')/1e6))
+			tracemalloc.reset_peak()
+		if COMPARE_BATCH:
+			compare_batch(levels)
+
+		print("iterating over angular velocities")
+
+		results = sweep(levels, load_results() if RESUME else start_results())
+
+	rotation_parameters = []
+	aspect_ratios, elongations = [], []
+	total_iterations = 0
+	try:
+		for ρ_min, ρ_max, z_max, ω, g_out, iterations, planet in results:
+			total_iterations += iterations
+			if np.isnan(ρ_min): # let us know how it went
+				print("xibay")
+			else:
+				print("win")
+			if np.isnan(ρ_max): # and stop trying if it's hitting the walls
+				break
+			rotation_parameters.append(ρ_max*ω**2/g_out)
+			if MODE == 'ellipsoid':
+				aspect_ratios.append(ρ_max/z_max)
+				elongations.append(0)
+			else:
+				aspect_ratios.append((ρ_max+ρ_min)/(ρ_max-ρ_min))
+				elongations.append((ρ_max-ρ_min)/(2*z_max))
+	finally:
+		results.close() # stop the sweep now (cancelling any solves still queued) rather than when main() returns
+
+	print("took {} iterations in total".format(total_iterations))
+	if REPORT_MEMORY:
+		print("peak memory while sweeping: {:.1f} MB".format(tracemalloc.get_traced_memory()[1]/1e6))
+
+	print("analisa")
+	rotation_parameters = np.array(rotation_parameters)
+	aspect_ratios = np.array(aspect_ratios)
+	elongations = np.array(elongations)
+	print(rotation_parameters)
+	print(aspect_ratios)
+	print(elongations)
+	valid = np.isfinite(aspect_ratios) & (rotation_parameters < 0.55)  # these results don't seem reliable for rotation parameters > 0.5
 	if MODE == 'ellipsoid':
-		aspect_ratios.append(ρ_max/z_max)
-		elongations.append(0)
+		# the first-order coefficient is 5/4, as can be found from differential analysis
+		# (see R. Fitzpatrick's "Introduction to Celestial Mechanics" (2012), 2nd edition available at
+		# https://farside.ph.utexas.edu/teaching/celestial/Celestialhtml/node52.html).
+		# the twoth- and third-order parameters are fit to my finite element solver's results.
+		x = rotation_parameters[valid]
+		α_fit_params, err = fit_linear(np.stack([x**2, x**3], axis=1), aspect_ratios[valid] - (1 + 5/4*x)) # 1 + 5/4*x + a*x**2 + b*x**3
+		α_fit = 1 + 5/4*rotation_parameters + α_fit_params[0]*rotation_parameters**2 + α_fit_params[1]*rotation_parameters**3
+		print("α = 1 + 5/4*Rω^2/g + {:.3f}*(Rω^2/g)^2 + {:.3f}*(Rω^2/g)^3".format(*α_fit_params))
+		e_fit = elongations
 	else:
-		aspect_ratios.append((ρ_max+ρ_min)/(ρ_max-ρ_min))
-		elongations.append((ρ_max-ρ_min)/(2*z_max))
-
-print("analisa")
-rotation_parameters = np.array(rotation_parameters)
-aspect_ratios = np.array(aspect_ratios)
-elongations = np.array(elongations)
-print(rotation_parameters)
-print(aspect_ratios)
-print(elongations)
-valid = np.isfinite(aspect_ratios) & (rotation_parameters < 0.55)  # these results don't seem reliable for rotation parameters > 0.5
-if MODE == 'ellipsoid':
-	# the first-order coefficient is 5/4, as can be found from differential analysis
-	# (see R. Fitzpatrick's "Introduction to Celestial Mechanics" (2012), 2nd edition available at
-	# https://farside.ph.utexas.edu/teaching/celestial/Celestialhtml/node52.html).
-	# the twoth- and third-order parameters are fit to my finite element solver's results.
-	α_fit_params, err = opt.curve_fit(lambda x, a, b: 1 + 5/4*x + a*x**2 + b*x**3, rotation_parameters[valid], aspect_ratios[valid])
-	α_fit = 1 + 5/4*rotation_parameters + α_fit_params[0]*rotation_parameters**2 + α_fit_params[1]*rotation_parameters**3
-	print("α = 1 + 5/4*Rω^2/g + {:.3f}*(Rω^2/g)^2 + {:.3f}*(Rω^2/g)^3".format(*α_fit_params))
-	e_fit = elongations
-else:
-	α_fit_params, err = opt.curve_fit(lambda x, a, b: (a*x + b*x**2), rotation_parameters[valid], 1/aspect_ratios[valid])
-	α_fit = 1/(α_fit_params[0]*rotation_parameters + α_fit_params[1]*rotation_parameters**2)
-	print("α = 1/({:.3f}*Rω^2/g + {:.3f}(Rω^2/g)^2)".format(*α_fit_params))
-	e_fit_params, err = opt.curve_fit(lambda x, a, b: 1+b*x+a*x**2, rotation_parameters[valid], elongations[valid])
-	e_fit = 1 + e_fit_params[1]*rotation_parameters + e_fit_params[0]*rotation_parameters**2
-	print("e = 1 + {1:.3f}*Rω^2/g + {0:.3f}*(Rω^2/g)^2".format(*e_fit_params))
-plt.figure()
-plt.plot(rotation_parameters[valid], aspect_ratios[valid], 'o')
-plt.plot(rotation_parameters[valid], α_fit[valid], '--')
-plt.xlabel("R*ω^2/g")
-plt.ylabel("α")
-plt.figure()
-plt.plot(rotation_parameters[valid], elongations[valid], 'o')
-plt.plot(rotation_parameters[valid], e_fit[valid], '--')
-plt.xlabel("R*ω^2/g")
-plt.ylabel("e")
-plt.show()
+		x = rotation_parameters[valid]
+		α_fit_params, err = fit_linear(np.stack([x, x**2], axis=1), 1/aspect_ratios[valid]) # 1/(a*x + b*x**2)
+		α_fit = 1/(α_fit_params[0]*rotation_parameters + α_fit_params[1]*rotation_parameters**2)
+		print("α = 1/({:.3f}*Rω^2/g + {:.3f}(Rω^2/g)^2)".format(*α_fit_params))
+		e_fit_params, err = fit_linear(np.stack([x**2, x], axis=1), elongations[valid] - 1) # 1 + b*x + a*x**2
+		e_fit = 1 + e_fit_params[1]*rotation_parameters + e_fit_params[0]*rotation_parameters**2
+		print("e = 1 + {1:.3f}*Rω^2/g + {0:.3f}*(Rω^2/g)^2".format(*e_fit_params))
+	plt.figure()
+	plt.plot(rotation_parameters[valid], aspect_ratios[valid], 'o')
+	plt.plot(rotation_parameters[valid], α_fit[valid], '--')
+	plt.xlabel("R*ω^2/g")
+	plt.ylabel("α")
+	plt.figure()
+	plt.plot(rotation_parameters[valid], elongations[valid], 'o')
+	plt.plot(rotation_parameters[valid], e_fit[valid], '--')
+	plt.xlabel("R*ω^2/g")
+	plt.ylabel("e")
+	if HEADLESS:
+		os.makedirs(FRAME_DIRECTORY, exist_ok=True)
+		for number in plt.get_fignums():
+			plt.figure(number).savefig(os.path.join(FRAME_DIRECTORY, f'{MODE}_fit_{number}.png'))
+	else:
+		plt.show()
+
+
+class Grid:
+	def __init__(self, res: int):
+		self.res = res
+		self.eigen_res = EIGEN_RES*res//RES # keep the same number of modes per cell at every resolution
+		self.ρ_mesh = np.linspace(0, ρB, int(MAX_ASPECT_RATIO*res)+1) # radial coordinate
+		self.z_mesh = np.linspace(0, zB, int(res)+1) # axial coordinate
+		self.dρ, self.dz = self.ρ_mesh[1], self.z_mesh[1]
+		self.ρ, self.z = self.ρ_mesh[:-1]+self.dρ/2, self.z_mesh[:-1]+self.dz/2
+		self.P, self.Z = np.meshgrid(self.ρ, self.z)
+
+
+if __name__ == '__main__':
+	main()
@@ -6,10 +6,11 @@ To view a copy of this license, visit <https://creativecommons.org/publicdomain/
 """
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy import optimize
 import seaborn as sns
 sns.set_style('whitegrid')
 
+from fitting import fit_linear
+
 n = 36
 m = 39
 l = 12
@@ -17,25 +18,85 @@ p = 4
 
 r0 = 1/2
 z0 = 1/4
+MEMORY_BUDGET = 2**28 # the number of bytes the insolation temporaries may take up at once
+ADAPTIVE_ORBIT = False # whether to integrate over the sun's path adaptively at each point instead of sampling it at m fixed positions
+ORBIT_TOLERANCE = 1e-4 # the absolute error in the normalized insolation at which the adaptive quadrature stops refining
+MAX_ORBIT_DEPTH = 20 # how many times the adaptive quadrature may bisect any one interval
+
+
+def disc_insolation(r, λ, ψ, m, r0, z0):
+	# the insolation at each radius, averaged over azimuth and over the year, for each axial tilt.
+	# the grid is done a block at a time so the (grid × tilt × sun position) temporaries stay within the memory budget
+	xS = r0*(1 + ψ[:, None]/(np.pi/2)*np.cos(np.linspace(0, np.pi, m))) # the sun's path for each tilt
+	# zS = z0*np.sqrt(1 - (xS/(2*r0))**2)
+	zS = z0
+	points = max(1, MEMORY_BUDGET//(4*xS.nbytes)) # how many grid points go in a block, allowing for a few temporaries
+	rows, columns = max(1, points//λ.size), min(λ.size, points)
+	S = np.zeros((r.size, ψ.size))
+	for i in range(0, r.size, rows):
+		for j in range(0, λ.size, columns):
+			X = (r[i:i + rows, None]*np.cos(λ[None, j:j + columns]))[:, :, None, None]
+			Y = (r[i:i + rows, None]*np.sin(λ[None, j:j + columns]))[:, :, None, None]
+			d2 = (X - xS)**2 + Y**2 + zS**2
+			S[i:i + rows] += np.sum(zS/(d2*np.sqrt(d2)), axis=(1, 3))
+	return S/(λ.size*m/z0**2)
+
+
+def adaptive_disc_insolation(r, λ, ψ, r0, z0, tolerance):
+	# the same thing, but integrating over the sun's path with adaptive Simpson's rule, which concentrates the sun
+	# positions near each point's peak.  every (point, tilt) pair is a separate integral, and they're all refined together.
+	points = max(1, MEMORY_BUDGET//(ψ.size*8*256)) # how many grid points go in a block, allowing for a few hundred intervals each
+	rows, columns = max(1, points//λ.size), min(λ.size, points)
+	S = np.zeros((r.size, ψ.size))
+	evaluations = 0
+	for i in range(0, r.size, rows):
+		for j in range(0, λ.size, columns):
+			X = r[i:i + rows, None]*np.cos(λ[None, j:j + columns])
+			Y = r[i:i + rows, None]*np.sin(λ[None, j:j + columns])
+			x, y, tilt = (q.ravel() for q in np.broadcast_arrays(X[:, :, None], Y[:, :, None], ψ[None, None, :]))
+
+			def kernel(q, u): # the insolation from the sun at phase u of integral q, normalized to 1 at the subsolar point
+				d2 = (x[q] - r0*(1 + tilt[q]/(np.pi/2)*np.cos(u)))**2 + y[q]**2 + z0**2
+				return z0**3/(d2*np.sqrt(d2))
+
+			total = np.zeros(x.size)
+			q = np.repeat(np.arange(x.size), 4) # start each integral with four intervals so symmetric peaks can't hide
+			a = np.tile(np.arange(4)*np.pi/4, x.size)
+			b = a + np.pi/4
+			nodes = kernel(np.repeat(np.arange(x.size), 9), np.tile(np.arange(9)*np.pi/8, x.size)).reshape(x.size, 9) # (which share their ends)
+			fa, fm, fb = nodes[:, 0:8:2].ravel(), nodes[:, 1:8:2].ravel(), nodes[:, 2:9:2].ravel()
+			whole = (b - a)/6*(fa + 4*fm + fb)
+			evaluations += nodes.size
+			for depth in range(MAX_ORBIT_DEPTH + 1):
+				f_left, f_right = kernel(q, (3*a + b)/4), kernel(q, (a + 3*b)/4)
+				evaluations += 2*q.size
+				left = (b - a)/12*(fa + 4*f_left + fm)
+				right = (b - a)/12*(fm + 4*f_right + fb)
+				error = left + right - whole
+				done = (abs(error) <= 15*tolerance*(b - a)) | (depth == MAX_ORBIT_DEPTH)
+				np.add.at(total, q[done], (left + right + error/15)[done])
+				split = ~done
+				mid = (a + b)/2
+				q = np.concatenate([q[split], q[split]])
+				a, b = np.concatenate([a[split], mid[split]]), np.concatenate([mid[split], b[split]])
+				fa, fm, fb = np.concatenate([fa[split], fm[split]]), np.concatenate([f_left[split], f_right[split]]), np.concatenate([fm[split], fb[split]])
+				whole = np.concatenate([left[split], right[split]])
+				if q.size == 0:
+					break
+			S[i:i + rows] += np.sum((total/np.pi).reshape(X.shape + ψ.shape), axis=1)
+	print(f"the adaptive orbit quadrature used {evaluations} kernel evaluations, compared to {r.size*λ.size*ψ.size*m} for {m} fixed sun positions")
+	return S/λ.size
 
 r = np.linspace(0, 2*r0, n)
 λ = np.linspace(0, np.pi, n)
 ɸ = np.arctan(z0/r)
 
-Λ, R = np.meshgrid(λ, r)
-Λ, Φ = np.meshgrid(λ, ɸ)
-
-X, Y = R*np.cos(Λ), R*np.sin(Λ)
-
 ψ = np.linspace(0, 1.5, l)
 
-S = np.zeros((n, l))
-for i in range(l):
-	xS = r0*(1 + ψ[i]/(np.pi/2)*np.cos(np.linspace(0, np.pi, m)))[None,None,:]
-	# zS = z0*np.sqrt(1 - (xS/(2*r0))**2)
-	zS = z0
-	S[:,i] = np.sum(zS/((X[:,:,None] - xS)**2 + Y[:,:,None]**2 + zS**2)**(3/2), axis=(1,2))
-S /= n*m/z0**2
+if ADAPTIVE_ORBIT:
+	S = adaptive_disc_insolation(r, λ, ψ, r0, z0, ORBIT_TOLERANCE)
+else:
+	S = disc_insolation(r, λ, ψ, m, r0, z0)
 
 sns.set_palette('rainbow', n_colors=l)
 plt.figure()
@@ -44,22 +105,13 @@ plt.plot(r, z0**3/(r**2 + z0**2)**(3/2), 'k--', label="tidally lockd")
 plt.xlabel("raditude")
 plt.ylabel("insolacion")
 
-C = np.empty((l, p))
-for i in range(l):
-	C[i,:] = np.polyfit(r**2, 1/S[:,i], p-1)[::-1]
-	# C[i,:] = optimize.curve_fit((lambda x,d,c,b,a: a*np.exp(-(x/b)**2) + c*np.exp(-(x/d)**2)), r, S[:,i], p0=[-.5, .5*r0, 1, 1.5*r0], maxfev=10000)[0]
+C = fit_linear(np.stack([r**(2*j) for j in range(p)], axis=1), 1/S)[0].T # fit a polynomial in r**2 for every tilt at once
 plt.figure()
 plt.plot(ψ, C)
 plt.xlabel("axial tilt")
 plt.ylabel("polynomial coefficient")
 
-slopes = np.empty(p)
-# blopes = np.empty(p)
-offsets = np.empty(p)
-for i in range(p):
-	a, c = optimize.curve_fit((lambda x,a,c: a*np.cos(2*x) + c), ψ, C[:,i])[0]
-	slopes[i] = a
-	offsets[i] = c
+slopes, offsets = fit_linear(np.stack([np.cos(2*ψ), np.ones(l)], axis=1), C)[0] # and fit a*cos(2ψ) + c to each coefficient
 slopes = np.around(slopes, 3)
 offsets = np.around(offsets, 3)
 print(slopes)
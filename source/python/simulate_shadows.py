@@ -4,6 +4,8 @@ simulate_shadows.py - search for a simple formula for the insolation on the insi
 This work by Justin Kunimune is marked with CC0 1.0 Universal.
 To view a copy of this license, visit <https://creativecommons.org/publicdomain/zero/1.0>
 """
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from scipy import integrate
 import matplotlib.pyplot as plt
@@ -16,96 +18,283 @@ l = 11
 k = 73
 R = 1.5
 κ = .6
+CHUNK_SIZE = 2**21 # the maximum number of sun-angle–surface-point pairs to evaluate at once
+ADAPTIVE_SAMPLING = False # whether to choose the sun angles adaptively rather than using m evenly spaced ones
+OPACITY_TOLERANCE = 1e-3 # the error in the yearly opacity curves at which to stop refining the adaptive sampling
+INITIAL_SUN_ANGLES = 9 # how many evenly spaced sun angles to start the adaptive sampling with
+MAX_REFINEMENTS = 12 # how many times the adaptive sampling may bisect any one interval
+ADAPTIVE_TIME_SAMPLES = 4096 # how many times of year to sample when weighting the adaptively chosen sun angles
+ANIMATION_INTERVAL = 3 # how many sun angles to advance between frames of the insolation animation (0 to skip it)
+CROSS_SECTION_PROBABILITY = 1e-1 # how often to plot a cross-section of the shadow calculation for a shaded sun angle
+PRECISION = 'float64' # the floating point type in which to do the occlusion test ('float32' is faster and agrees almost everywhere)
+COMPARE_RAY_MARCHING = False # whether to check the occlusion test against brute-force ray marching before running
+OPACITY_SWEEP = False # whether to tabulate the opacity over the parameter grid below instead of studying the single R and κ above
+SWEEP_R = np.linspace(1.5, 6.0, 10) # the major radii (in units of the minor radius) to tabulate, spanning the toroids Toroid allows
+SWEEP_κ = np.linspace(0.5, 1.0, 6) # the elongations to tabulate
+WORKERS = 1 # number of processes among which to split the parameter sweep
+OPACITY_TABLE = 'toroid_opacity.npz' # where to save the opacity table and the residuals of the closed-form fit
 
-ɸ = np.linspace(-np.pi/2, np.pi/2, n)
-λ = np.linspace(0, np.pi, n)
-β = np.arctan(κ*np.tan(ɸ))
-
-Λ, Φ = np.meshgrid(λ, ɸ)
-Λ, B = np.meshgrid(λ, β)
-
-θ = np.linspace(0, np.pi/2, m)
 
-S_saf = np.zeros((m, n, n))
-S_say = np.zeros((m, n, n))
-
-for i in range(m): # start by iterating over all axis-planet-sun-angles
+def surface_geometry(ɸ, λ, R, κ):
+	β = np.arctan(κ*np.tan(ɸ))
+	Λ, Φ = np.meshgrid(λ, ɸ)
+	Λ, B = np.meshgrid(λ, β)
 	x = (R - np.cos(B))*np.sin(Λ)
 	y = (R - np.cos(B))*np.cos(Λ)
 	z = κ*np.sin(B)
 	ny = -np.cos(Φ)*np.cos(Λ)
 	nz = np.sin(Φ)
-	sy = np.cos(θ[i])
-	sz = -np.sin(θ[i])
-
-	if np.tan(θ[i]) < κ or np.sin(θ[i]) < 1/R:
-		μ = (sz/sy)/κ
-		z0 = z/κ - μ*y
-		a = (μ**2 + 1)**2
-		b = 4*μ*z0*(μ**2 + 1)
-		c = 2*(μ**2 + 1)*(R**2 + x**2 + z0**2 - 1) + 4*μ**2*z0**2 - 4*R**2
-		d = 4*μ*z0*(R**2 + x**2 + z0**2 - 1)
-		e = (R**2 + x**2 + z0**2 - 1)**2 - 4*R**2*x**2
-		a, b, c, d, e = a/30, b/30, c/30, d/30, e/30 # this helps with overflow
-		Δ = 256*a**3*e**3 - 192*a**2*b*d*e**2 - 128*a**2*c**2*e**2 + 144*a**2*c*d**2*e \
-			- 27*a**2*d**4 + 144*a*b**2*c*e**2 - 6*a*b**2*d**2*e - 80*a*b*c**2*d*e \
-			+ 18*a*b*c*d**3 + 16*a*c**4*e - 4*a*c**3*d**2 - 27*b**4*e**2 + 18*b**3*c*d*e \
-			- 4*b**3*d**3 - 4*b**2*c**3*e + b**2*c**2*d**2
-		clear = np.logical_or(Δ < 0, y < 0)
-
-		if np.random.random() < 1e-1:
-			plt.figure()
-			j = np.random.randint(n)
-			k = np.random.randint(n)
-			Y = np.linspace(np.sqrt((R-1)**2 - np.minimum(R-1, x[j,k])**2), np.sqrt((R+1)**2 - x[j,k]**2), 217)
-			plt.plot( Y,  κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
-			plt.plot(-Y,  κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
-			plt.plot( Y, -κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
-			plt.plot(-Y, -κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
-			Yp = np.linspace(-R-1, R+1)
-			Zp = a*Yp**4 + b[j,k]*Yp**3 + c[j,k]*Yp**2 + d[j,k]*Yp + e[j,k]
-			plt.plot(Yp, 2*Zp/abs(Zp).max())
-			plt.axline((y[j,k], z[j,k]), slope=sz/sy, color='g' if (ny[j,k]*sy + nz[j,k]*sz <= 0 and clear[j,k]) else 'r')
-			plt.scatter([y[j,k]], [z[j,k]], c='k')
-			plt.axis('equal')
-			plt.xlim(-R - 1, R + 1)
-			plt.show()
+	return x, y, z, ny, nz
+
+
+def may_be_shaded(θ, R, κ):
+	return (np.tan(θ) < κ) | (np.sin(θ) < 1/R)
+
+
+def occluded(x, y, z, sun, R, κ, dtype=np.float64):
+	# whether the ray from each point on the toroid toward the sun hits the toroid again; the sun direction may be an array
+	L = R + 1 # scale all lengths so the tube is circular and the coefficients are all of order unity
+	px, py, pz = (np.asarray(q, dtype=dtype) for q in (x/L, y/L, z/κ/L))
+	ux, uy, uz = sun[0], sun[1], np.divide(sun[2], κ)
+	norm = np.sqrt(np.square(ux) + np.square(uy) + np.square(uz))
+	ux, uy, uz = (np.asarray(u, dtype=dtype) for u in (ux/norm, uy/norm, uz/norm))
+	ρ2, r2 = dtype((R/L)**2), dtype((1/L)**2)
+	h = px*ux + py*uy + pz*uz
+	G = px*px + py*py + pz*pz + (ρ2 - r2)
+	# the ray p + tu meets the surface (|q|² + ρ² - r²)² = 4ρ²(qx² + qy²) at the roots of a quartic in t, one of which is
+	# t = 0 because p is on the surface; dropping it leaves the monic cubic t³ + A t² + B t + C
+	A = 4*h
+	B = 4*h*h + 2*G - 4*ρ2*(ux*ux + uy*uy)
+	C = 4*h*G - 8*ρ2*(px*ux + py*uy)
+	# C is the slope of the implicit function along the ray, so C < 0 means the ray heads straight into the toroid.
+	# otherwise, there's a positive root iff the cubic's local minimum is at positive t and isn't above zero.
+	D = A*A - 3*B
+	t_min = (np.sqrt(np.maximum(D, 0)) - A)/3
+	value = ((t_min + A)*t_min + B)*t_min + C
+	return (C < 0) | ((D > 0) & (t_min > 0) & (value <= 0))
+
+
+def ray_march(x, y, z, sun, R, κ, steps=4000): # do the same thing the slow and obvious way
+	hit = np.zeros(np.shape(x), dtype=bool)
+	direction = np.array(sun)/np.linalg.norm(sun)
+	for t in np.linspace(2*(R + 1)/steps, 2*(R + 1), steps):
+		qx, qy, qz = x + t*direction[0], y + t*direction[1], z/κ + t*direction[2]/κ
+		hit |= (qx**2 + qy**2 + qz**2 + R**2 - 1)**2 < 4*R**2*(qx**2 + qy**2)
+	return hit
+
+
+def compare_ray_marching(geometry, R, κ):
+	x, y, z, ny, nz = geometry
+	mismatches, total = 0, 0
+	for θ in np.linspace(0, np.pi/2, 37)[1:-1]:
+		sun = (0, -np.cos(θ), np.sin(θ))
+		lit = ny*sun[1] + nz*sun[2] > 1e-3 # skip grazing points, where even the ray marching is unreliable
+		mismatches += np.sum(lit & (occluded(x, y, z, sun, R, κ, np.dtype(PRECISION).type) != ray_march(x, y, z, sun, R, κ)))
+		total += np.sum(lit)
+	print(f"the occlusion test disagrees with ray marching at {mismatches} of {total} lit points")
+
+
+def illuminate(θ, geometry, R, κ): # compute the insolation on the inner hemispire for an array of sun angles, with and without autosciation
+	x, y, z, ny, nz = geometry
+	sy = np.cos(θ)[:, np.newaxis, np.newaxis]
+	sz = -np.sin(θ)[:, np.newaxis, np.newaxis]
+	S_saf = -np.minimum(0, ny*sy + nz*sz)
+	clear = np.ones(S_saf.shape, dtype=bool)
+	shaded = may_be_shaded(θ, R, κ)
+	if np.any(shaded):
+		clear[shaded] = ~occluded(x, y, z, (0, -sy[shaded], -sz[shaded]), R, κ, np.dtype(PRECISION).type)
+	return S_saf, S_saf*clear
+
+
+def yearly_weights(θ, ψ, k):
+	# the weight of each sun angle in the yearly average for each obliquity, sampling k times of year and interpolating
+	t = np.linspace(0, np.pi/2, k)
+	θ_samp = np.arcsin(np.sin(ψ[:, np.newaxis])*np.sin(t))
+	i = np.clip(np.searchsorted(θ, θ_samp), 1, θ.size - 1)
+	w = np.clip((θ_samp - θ[i - 1])/(θ[i] - θ[i - 1]), 0, 1)
+	rows = np.broadcast_to(np.arange(ψ.size)[:, np.newaxis], i.shape)
+	W = np.zeros((ψ.size, θ.size))
+	np.add.at(W, (rows, i - 1), (1 - w)/k)
+	np.add.at(W, (rows, i), w/k)
+	return W
+
+
+def yearly_averages(θ, ψ, k, geometry, R, κ, frames=None):
+	# average the insolation over the year for each obliquity, a chunk of sun angles at a time so the full (θ, ɸ, λ) cube never exists
+	W = yearly_weights(θ, ψ, k)
+	S_ide = np.zeros((ψ.size, geometry[0].shape[0]))
+	S_tru = np.zeros((ψ.size, geometry[0].shape[0]))
+	chunk = max(1, CHUNK_SIZE//geometry[0].size)
+	for start in range(0, θ.size, chunk):
+		S_saf, S_say = illuminate(θ[start:start + chunk], geometry, R, κ)
+		if frames is not None:
+			frames(start, S_say)
+		S_ide += W[:, start:start + chunk]@seasonal_profile(S_saf)
+		S_tru += W[:, start:start + chunk]@seasonal_profile(S_say)
+	return S_ide, S_tru
+
+
+def adaptive_yearly_averages(ψ, k, geometry, R, κ, tolerance):
+	# average the insolation over the year, bisecting only the intervals in sun angle where that changes the opacity curves
+	θ = np.linspace(0, np.pi/2, INITIAL_SUN_ANGLES)
+	θ = np.unique(np.concatenate([θ, [np.arctan(κ), np.arcsin(min(1, 1/R))]])) # start with the regime boundaries sampled
+	P_ide, P_tru = profiles(θ, geometry, R, κ)
+	error = np.full((θ.size - 1, ψ.size, P_ide.shape[1]), np.inf) # how much bisecting each interval would change each opacity curve
+	while np.max(np.sum(error, axis=0)) > tolerance:
+		score = np.max(error, axis=(1, 2))
+		if np.any(np.isinf(score)): # bisect every interval that hasn't been measured yet
+			left = np.nonzero(np.isinf(score))[0]
+		else: # then the intervals responsible for half of the error
+			order = np.argsort(-score)
+			worst = np.cumsum(score[order]) < np.sum(score[order])/2
+			left = np.sort(order[:np.count_nonzero(worst) + 1])
+		left = left[θ[left + 1] - θ[left] > np.pi/2/INITIAL_SUN_ANGLES/2**MAX_REFINEMENTS]
+		if left.size == 0:
+			print(f"the adaptive sampling hit its resolution limit with an estimated error of {np.max(np.sum(error, axis=0)):.1e}")
+			break
+		θ_mid = (θ[left] + θ[left + 1])/2
+		P_ide_mid, P_tru_mid = profiles(θ_mid, geometry, R, κ)
+		deviation_ide = P_ide_mid - (P_ide[left] + P_ide[left + 1])/2 # how far off the linear interpolation was at each midpoint
+		deviation_tru = P_tru_mid - (P_tru[left] + P_tru[left + 1])/2
+		θ = np.insert(θ, left + 1, θ_mid)
+		P_ide = np.insert(P_ide, left + 1, P_ide_mid, axis=0)
+		P_tru = np.insert(P_tru, left + 1, P_tru_mid, axis=0)
+		middle = left + 1 + np.arange(left.size) # the new indices of the midpoints
+
+		W = yearly_weights(θ, ψ, ADAPTIVE_TIME_SAMPLES) # the weights are cheap, so integrate over the year more finely than k
+		S_ide, S_tru = W@P_ide, W@P_tru
+		opacity = 1 - S_tru/np.maximum(S_ide, 1e-6)
+		weight = W[:, middle, np.newaxis]/np.maximum(S_ide, 1e-6)[:, np.newaxis, :]
+		change = abs(weight*(deviation_tru - opacity[:, np.newaxis, :]*deviation_ide)).transpose((1, 0, 2)) # how much each midpoint moved the opacity
+		error = np.insert(error, left + 1, 0, axis=0)
+		error[middle - 1] = error[middle] = change/2 # split each measured change between the two halves
+	print(f"the adaptive sampling used {θ.size} sun angles to resolve the opacity to ±{tolerance:.0e}, compared to {m} for the uniform grid")
+	return S_ide, S_tru
+
 
+def profiles(θ, geometry, R, κ): # the insolation at each latitude, averaged over longitude and season, for an array of sun angles
+	P_ide = np.empty((θ.size, geometry[0].shape[0]))
+	P_tru = np.empty((θ.size, geometry[0].shape[0]))
+	chunk = max(1, CHUNK_SIZE//geometry[0].size)
+	for start in range(0, θ.size, chunk):
+		S_saf, S_say = illuminate(θ[start:start + chunk], geometry, R, κ)
+		P_ide[start:start + chunk] = seasonal_profile(S_saf)
+		P_tru[start:start + chunk] = seasonal_profile(S_say)
+	return P_ide, P_tru
+
+
+def seasonal_profile(S):
+	return np.mean(S, axis=2) + np.mean(S[:,::-1,:], axis=2) # the sun spends half the year on each side
+
+
+def opacity_curves(R, κ, ψ):
+	# the yearly opacity at each latitude of the inner hemispire for each obliquity
+	ɸ = np.linspace(-np.pi/2, np.pi/2, n)
+	geometry = surface_geometry(ɸ, np.linspace(0, np.pi, n), R, κ)
+	if ADAPTIVE_SAMPLING:
+		S_ide, S_tru = adaptive_yearly_averages(ψ, k, geometry, R, κ, OPACITY_TOLERANCE)
 	else:
-		clear = True
-
-	S_saf[i,:,:] = -np.minimum(0, ny*sy + nz*sz) # compute the insolation on each point in the inner hemispire
-	S_say[i,:,:] = S_saf[i,:,:] * clear # and account for autosciation
-
-for i in range(0, m, 3): # plot the results thus far
-	plt.clf()
-	plt.contourf( λ,  ɸ, S_say[i,:,:], levels=np.linspace(0, 1, 8))
-	plt.contourf(-λ,  ɸ, S_say[i,:,:], levels=np.linspace(0, 1, 8))
-	plt.pause(0.01)
-plt.show()
-
-ψ = np.linspace(0, np.pi/2, l)
-t = np.linspace(0, np.pi/2, k)
-
-S_ide = np.zeros((l, n)) # average it out over the year for various obliquities
-S_tru = np.zeros((l, n))
-for j in range(l):
-	θ_samp = np.arcsin(np.sin(ψ[j])*np.sin(t))
-	i = np.round(np.interp(θ_samp, θ, np.arange(m))).astype(int)
-	for sign in [-1, 1]:
-		S_ide[j,:] += np.mean(S_saf[i,::sign,:], axis=(0, 2))
-		S_tru[j,:] += np.mean(S_say[i,::sign,:], axis=(0, 2))
-
-sns.set_palette('rainbow', n_colors=l)
-for j in range(l):
-	plt.plot(np.degrees(β), 1 - S_tru[j,:]/S_ide[j,:], label=f"Obliquity={np.degrees(ψ[j]):.0f}°")
-for j in range(l):
-	dz = 2*R*np.tan(ψ[j])/κ
-	if dz == 0:
-		plt.plot(np.degrees(β), np.ones(β.shape), '--')
+		S_ide, S_tru = yearly_averages(np.linspace(0, np.pi/2, m), ψ, k, geometry, R, κ)
+	lit = S_ide > 1e-6 # the poles barely see the sun, so leave them undefined
+	return np.where(lit, 1 - S_tru/np.where(lit, S_ide, 1), np.nan)
+
+
+def closed_form_opacity(ɸ, ψ, R, κ):
+	# the approximation used by Toroid.insolation() in toroid.ts, for the latitudes of the inner hemispire
+	β = np.arctan(κ*np.tan(ɸ))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		dz = 2*R*np.tan(ψ)/κ
+		opacity = np.minimum(1, np.minimum(1, (1 - np.sin(β))/dz) * np.minimum(1, (1 + np.sin(β))/dz) \
+			+ 0.4*np.sin(2*β)**2/(1 + dz) + 0.8*κ/R*np.cos(ɸ)**3)
+	return np.where(ψ == 0, 1, opacity)
+
+
+def sweep_opacity_table():
+	# tabulate the opacity over latitude, obliquity, major radius, and elongation, and see how well the closed form does
+	ɸ = np.linspace(-np.pi/2, np.pi/2, n)
+	ψ = np.linspace(0, np.pi/2, l)
+	jobs = [(R, κ) for R in SWEEP_R for κ in SWEEP_κ]
+	with ProcessPoolExecutor(max(1, WORKERS)) as executor:
+		curves = list(executor.map(opacity_curves, *zip(*jobs), [ψ]*len(jobs)))
+	opacity = np.stack(curves, axis=-1).reshape((l, n, SWEEP_R.size, SWEEP_κ.size)).transpose((1, 0, 2, 3))
+	residual = opacity - closed_form_opacity(
+		ɸ[:, None, None, None], ψ[None, :, None, None], SWEEP_R[None, None, :, None], SWEEP_κ[None, None, None, :])
+	np.savez_compressed(
+		OPACITY_TABLE, latitude=ɸ, obliquity=ψ, R=SWEEP_R, κ=SWEEP_κ,
+		opacity=opacity.astype(np.float32), residual=residual.astype(np.float32))
+	print(f"saved the opacity table to {OPACITY_TABLE}; the closed form is off by "
+	      f"{np.sqrt(np.nanmean(residual**2)):.3f} RMS and {np.nanmax(abs(residual)):.3f} at worst")
+	worst = np.nanmax(abs(residual), axis=(0, 1))
+	for i in range(SWEEP_R.size):
+		print(f"R = {SWEEP_R[i]:.2f}: worst residual " + ", ".join(f"{worst[i, j]:.3f}" for j in range(SWEEP_κ.size)) + " for each κ")
+
+
+def plot_cross_section(θ, geometry, j, k, R, κ):
+	x, y, z, ny, nz = geometry
+	sy = np.cos(θ)
+	sz = -np.sin(θ)
+	clear = ~occluded(x, y, z, (0, -sy, -sz), R, κ)
+	plt.figure()
+	Y = np.linspace(np.sqrt((R-1)**2 - np.minimum(R-1, x[j,k])**2), np.sqrt((R+1)**2 - x[j,k]**2), 217)
+	plt.plot( Y,  κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
+	plt.plot(-Y,  κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
+	plt.plot( Y, -κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
+	plt.plot(-Y, -κ*np.sqrt(np.maximum(0, 1 - (R - np.hypot(Y, x[j,k]))**2)), 'k-')
+	Yp = np.linspace(-R-1, R+1)
+	Zp = z[j,k]/κ + (Yp - y[j,k])*(sz/sy)/κ
+	Fp = (Yp**2 + x[j,k]**2 + Zp**2 + R**2 - 1)**2 - 4*R**2*(Yp**2 + x[j,k]**2) # this is negative wherever the ray is inside the toroid
+	plt.plot(Yp, 2*Fp/abs(Fp).max())
+	plt.axline((y[j,k], z[j,k]), slope=sz/sy, color='g' if (ny[j,k]*sy + nz[j,k]*sz <= 0 and clear[j,k]) else 'r')
+	plt.scatter([y[j,k]], [z[j,k]], c='k')
+	plt.axis('equal')
+	plt.xlim(-R - 1, R + 1)
+	plt.show()
+
+
+def main():
+	if OPACITY_SWEEP:
+		sweep_opacity_table()
+		return
+
+	ɸ = np.linspace(-np.pi/2, np.pi/2, n)
+	λ = np.linspace(0, np.pi, n)
+	β = np.arctan(κ*np.tan(ɸ))
+	geometry = surface_geometry(ɸ, λ, R, κ) # this doesn't depend on the sun angle, so only compute it once
+	if COMPARE_RAY_MARCHING:
+		compare_ray_marching(geometry, R, κ)
+
+	θ = np.linspace(0, np.pi/2, m)
+
+	for i in np.nonzero(may_be_shaded(θ, R, κ))[0]: # spot-check the shadowing calculation
+		if np.random.random() < CROSS_SECTION_PROBABILITY:
+			plot_cross_section(θ[i], geometry, np.random.randint(n), np.random.randint(n), R, κ)
+
+	def show_frames(start, S_say): # plot the results thus far
+		for i in range(-start%ANIMATION_INTERVAL, S_say.shape[0], ANIMATION_INTERVAL):
+			plt.clf()
+			plt.contourf( λ,  ɸ, S_say[i,:,:], levels=np.linspace(0, 1, 8))
+			plt.contourf(-λ,  ɸ, S_say[i,:,:], levels=np.linspace(0, 1, 8))
+			plt.pause(0.01)
+
+	ψ = np.linspace(0, np.pi/2, l)
+
+	if ADAPTIVE_SAMPLING:
+		S_ide, S_tru = adaptive_yearly_averages(ψ, k, geometry, R, κ, OPACITY_TOLERANCE)
 	else:
-		plt.plot(np.degrees(β), np.minimum(1, np.minimum(1, (1 - np.sin(β))/dz) * np.minimum(1, (1 + np.sin(β))/dz) + 0.8*np.cos(ɸ)**3*np.sqrt(κ)/R + 0.4*np.sin(2*β)**2/(1+dz)), '--')
-plt.xlabel("Latitude (°)")
-plt.ylabel("Opacity")
-plt.legend()
-plt.show()
+		S_ide, S_tru = yearly_averages( # evaluate all axis-planet-sun-angles and average them out over the year for various obliquities
+			θ, ψ, k, geometry, R, κ, frames=show_frames if ANIMATION_INTERVAL > 0 else None)
+	plt.show()
+
+	sns.set_palette('rainbow', n_colors=l)
+	for j in range(l):
+		plt.plot(np.degrees(β), 1 - S_tru[j,:]/S_ide[j,:], label=f"Obliquity={np.degrees(ψ[j]):.0f}°")
+	for j in range(l): # and compare them to the closed form that the opacity table's residuals refer to
+		plt.plot(np.degrees(β), closed_form_opacity(ɸ, ψ[j], R, κ), '--')
+	plt.xlabel("Latitude (°)")
+	plt.ylabel("Opacity")
+	plt.legend()
+	plt.show()
+
+
+if __name__ == '__main__':
+	main()
@@ -4,14 +4,25 @@ simulate_sunlight.py - validate the insolation on an oblique sphere
 This work by Justin Kunimune is marked with CC0 1.0 Universal.
 To view a copy of this license, visit <https://creativecommons.org/publicdomain/zero/1.0>
 """
+import json
+import time
+
 import numpy as np
-from scipy import integrate, optimize
+from scipy import integrate, ndimage
 import matplotlib.pyplot as plt
 import seaborn as sns
 sns.set_style('whitegrid')
 
+from fitting import fit_curves, fit_linear
+
 AXIAL_TILTS = np.linspace(0, np.pi/2, 20)
 LATITUDES = np.linspace(0, np.pi/2, 16)
+QUADRATURE = 'grid' # how to do the integrals ('grid' for a shared grid over the orbit with the day done exactly, 'dblquad' for adaptive quadrature)
+ORBIT_SAMPLES = 1024 # the number of points in the year at which the grid quadrature evaluates every latitude and tilt
+CONVERGENCE_REPORT = False # whether to compare the grid quadrature at various resolutions against dblquad before running
+INSOLATION_TABLE = 'insolation_table.npz' # where to save the dense latitude × obliquity table (it's built on first use)
+TABLE_RESOLUTION = 181 # the number of latitudes and of obliquities in the table (181 puts one every half degree)
+CHECK_FORMULAS = False # whether to check the Legendre formula from spheroid.ts against the table before running
 
 
 def vector(λ, θ):
@@ -21,6 +32,85 @@ def vector(λ, θ):
 		np.sin(λ)], axis=0)
 
 
+def daily_insolation(λ, δ):
+	# the insolation at latitude λ averaged over a day when the sun is at declination δ, which is max(0, vector(λ, θ)·vector(δ, 0))
+	# averaged over the hour angle θ, which can be done exactly because the integrand is A cos θ + B up to the terminator
+	A = np.cos(λ)*np.cos(δ)
+	B = np.sin(λ)*np.sin(δ)
+	θ_0 = np.arccos(np.clip(-B/np.maximum(A, np.finfo(float).tiny), -1, 1)) # the hour angle of sunset
+	return (A*np.sin(θ_0) + B*θ_0)/np.pi
+
+
+def grid_temperatures(latitudes, axial_tilts, samples):
+	# average the daily insolation over the year for every latitude and tilt at once on a shared (periodic) grid of orbital phases
+	ɸ = 2*np.pi*np.arange(samples)/samples
+	δ = axial_tilts[np.newaxis, :, np.newaxis]*np.sin(ɸ)
+	return np.mean(daily_insolation(latitudes[:, np.newaxis, np.newaxis], δ), axis=2)
+
+
+def load_insolation_table(filename):
+	key = table_key()
+	try: # see if we've already built this table
+		with np.load(filename) as data:
+			stale = json.loads(str(data['key'])) != key
+	except (FileNotFoundError, KeyError, ValueError):
+		stale = True
+	if stale: # if not (or if the parameters have changed since), build it and save it
+		latitudes = np.linspace(0, np.pi/2, TABLE_RESOLUTION)
+		obliquities = np.linspace(0, np.pi/2, TABLE_RESOLUTION)
+		values = np.empty((latitudes.size, obliquities.size))
+		for i in range(0, latitudes.size, 8): # a few rows at a time so the grid quadrature doesn't need gigabytes
+			values[i:i + 8] = 4*grid_temperatures(latitudes[i:i + 8], obliquities, ORBIT_SAMPLES)
+		np.savez(filename, key=json.dumps(key), latitude=latitudes, obliquity=obliquities, insolation=values.astype(np.float32))
+	with np.load(filename) as data:
+		return InsolationTable(data['latitude'], data['obliquity'], data['insolation'])
+
+
+def table_key():
+	return dict(
+		TABLE_RESOLUTION=TABLE_RESOLUTION, ORBIT_SAMPLES=ORBIT_SAMPLES,
+		FORMAT='float32 insolation normalized to a global mean of 1, on an even grid of latitude and obliquity from 0 to π/2')
+
+
+def dblquad_temperatures(latitudes, axial_tilts):
+	temperatures = np.empty((len(latitudes), len(axial_tilts)))
+	for i in range(len(latitudes)):
+		for j in range(len(axial_tilts)):
+			λ = latitudes[i]
+			Δλ = axial_tilts[j]
+			total, err = integrate.dblquad(lambda θ, ɸ: np.maximum(0, np.sum(vector(λ, θ)*vector(Δλ*np.sin(ɸ), 0), axis=0)), 0, 2*np.pi, lambda ɸ: 0, lambda ɸ: 2*np.pi,
+				epsabs=1e-0, epsrel=1e-2)
+			temperatures[i,j] = total/(2*np.pi)**2
+	return temperatures
+
+
+def report_convergence():
+	start = time.perf_counter()
+	reference = dblquad_temperatures(LATITUDES, AXIAL_TILTS)
+	print(f"dblquad took {time.perf_counter() - start:.2f} s")
+	finest = grid_temperatures(LATITUDES, AXIAL_TILTS, 2**16)
+	for samples in [4, 16, 64, 256, 1024, 4096]:
+		start = time.perf_counter()
+		temperatures = grid_temperatures(LATITUDES, AXIAL_TILTS, samples)
+		print(f"the grid quadrature with {samples} samples took {time.perf_counter() - start:.1e} s and differs by "
+		      f"{np.max(abs(temperatures - finest)):.1e} from itself at {2**16} samples and {np.max(abs(temperatures - reference)):.1e} from dblquad")
+
+
+def check_formulas(table):
+	rng = np.random.default_rng(0)
+	latitude = rng.uniform(-np.pi/2, np.pi/2, 1_000_000)
+	obliquity = rng.uniform(0, np.pi/2, 1_000_000)
+	start = time.perf_counter()
+	tabulated = table.insolation(latitude, obliquity)
+	print(f"the table gave {latitude.size:.0e} values in {time.perf_counter() - start:.2f} s")
+	ɸ = 2*np.pi*np.arange(ORBIT_SAMPLES)/ORBIT_SAMPLES
+	exact = 4*np.mean(daily_insolation(latitude[:1000, np.newaxis], obliquity[:1000, np.newaxis]*np.sin(ɸ)), axis=1)
+	print(f"its interpolation error is up to {np.max(abs(tabulated[:1000] - exact)):.1e}")
+	legendre = 1 - 5/8*p2(np.cos(obliquity))*p2(np.sin(latitude)) - 9/64*p4(np.cos(obliquity))*p4(np.sin(latitude)) \
+		- 65/1024*p6(np.cos(obliquity))*p6(np.sin(latitude))
+	print(f"the Legendre formula from spheroid.ts is off by {np.sqrt(np.mean((legendre - tabulated)**2)):.1e} RMS and up to {np.max(abs(legendre - tabulated)):.1e}")
+
+
 def powcos(x, a, δ, γ):
 	return δ + a*np.cos(x)**γ
 
@@ -49,27 +139,42 @@ def p6(x):
 	return (231*x**6 - 315*x**4 + 105*x**2 - 5)/16
 
 
+class InsolationTable:
+	def __init__(self, latitudes: np.ndarray, obliquities: np.ndarray, values: np.ndarray):
+		self.latitudes = latitudes
+		self.obliquities = obliquities
+		self.values = values
+		# it's even about 0 and π/2 in both latitude and obliquity, so mirroring at the edges is exact
+		self.coefficients = ndimage.spline_filter(values.astype(float), order=3, mode='mirror')
+
+	def insolation(self, latitude, obliquity):
+		# the annual mean insolation, normalized like Spheroid.annualInsolationFunction() so the global mean is 1
+		latitude, obliquity = np.broadcast_arrays(latitude, obliquity)
+		i = (latitude - self.latitudes[0])/(self.latitudes[1] - self.latitudes[0])
+		j = (obliquity - self.obliquities[0])/(self.obliquities[1] - self.obliquities[0])
+		return ndimage.map_coordinates(
+			self.coefficients, np.stack([i.ravel(), j.ravel()]), order=3, mode='mirror', prefilter=False).reshape(latitude.shape)
+
+
 if __name__ == '__main__':
-	TEMPERATURES = np.empty((len(LATITUDES), len(AXIAL_TILTS)))
-	for i in range(len(LATITUDES)):
-		for j in range(len(AXIAL_TILTS)):
-			λ = LATITUDES[i]
-			Δλ = AXIAL_TILTS[j]
-			total, err = integrate.dblquad(lambda θ, ɸ: np.maximum(0, np.sum(vector(λ, θ)*vector(Δλ*np.sin(ɸ), 0), axis=0)), 0, 2*np.pi, lambda ɸ: 0, lambda ɸ: 2*np.pi,
-				epsabs=1e-0, epsrel=1e-2)
-			TEMPERATURES[i,j] = total/(2*np.pi)**2
+	if CONVERGENCE_REPORT:
+		report_convergence()
 
-	PARAMS = np.empty((3, len(AXIAL_TILTS)))
-	FIT_TEMPERATURES = np.empty(TEMPERATURES.shape)
-	for j in range(len(AXIAL_TILTS)):
-		params, pcov = optimize.curve_fit(
-			powcos, LATITUDES, TEMPERATURES[:,j],
-			p0=(TEMPERATURES[0,j]-TEMPERATURES[-1,j], TEMPERATURES[-1,j], 1))
-		PARAMS[:,j] = params
-		FIT_TEMPERATURES[:,j] = powcos(LATITUDES, *params)
-
-	ampl_params, pcov = optimize.curve_fit(line, AXIAL_TILTS, PARAMS[0,:])
-	shift_params, pcov = optimize.curve_fit(prop, AXIAL_TILTS, PARAMS[1,:])
+	if CHECK_FORMULAS:
+		check_formulas(load_insolation_table(INSOLATION_TABLE))
+
+	if QUADRATURE == 'dblquad':
+		TEMPERATURES = dblquad_temperatures(LATITUDES, AXIAL_TILTS)
+	else:
+		TEMPERATURES = grid_temperatures(LATITUDES, AXIAL_TILTS, ORBIT_SAMPLES)
+
+	PARAMS, pcovs = fit_curves( # fit all of the tilts at once
+		powcos, LATITUDES, TEMPERATURES,
+		p0=(TEMPERATURES[0,:]-TEMPERATURES[-1,:], TEMPERATURES[-1,:], np.ones(len(AXIAL_TILTS))))
+	FIT_TEMPERATURES = powcos(LATITUDES[:,None], *PARAMS[:,None,:])
+
+	ampl_params, pcov = fit_linear(np.stack([AXIAL_TILTS, np.ones(len(AXIAL_TILTS))], axis=1), PARAMS[0,:]) # line
+	shift_params, pcov = fit_linear(AXIAL_TILTS[:,None], PARAMS[1,:]) # prop
 	power_params = [(PARAMS[2,-1]-PARAMS[2,0])/(np.pi/2), 1]
 
 	FIT_PARAMS = np.empty(PARAMS.shape)
@@ -3,15 +3,21 @@ This work by Justin Kunimune is marked with CC0 1.0 Universal.
 To view a copy of this license, visit <https://creativecommons.org/publicdomain/zero/1.0>
 """
 from matplotlib import pyplot as plt
-from numpy import linspace, exp, stack, full, array, concatenate, expand_dims, arange, newaxis
+from numpy import linspace, array, arange, newaxis, asarray, einsum, zeros, empty, broadcast_shapes, broadcast_to, maximum, mean, std, percentile
+from numpy.random import default_rng
+from scipy.linalg import expm
 
 k = 0.01
+SAMPLES_PER_STEP = 49 # how many times to report within each step
 
 ɣ_A = 0.0015
 ɣ_B = 0.0010
 ɣ_C = 0.0005
 ɣ_D = 0.0000
 
+ENSEMBLE_SIZE = 0 # how many randomized civilizations to run and summarize instead of plotting the single one (0 to skip it)
+RATE_SPREAD = 0.3 # the standard deviation of the log of the randomized growth and diffusion rates
+
 
 def main():
 	step_size = 100
@@ -24,23 +30,25 @@ def main():
 
 	initial_state = array([T_A_0, T_B_0, T_C_0, T_D_0])
 
-	jank_time = array([0])
-	jank_solution = expand_dims(initial_state, axis=0)
+	if ENSEMBLE_SIZE > 0:
+		summarize_ensemble(initial_state, step_size, num_steps, [ɣ_A, ɣ_B, ɣ_C, ɣ_D], k, ENSEMBLE_SIZE)
+		return
+
+	samples = SAMPLES_PER_STEP
+	jank_time = empty(1 + num_steps*(samples + 1)) # each step is a diffusion phase followed by an instantaneous growth phase
+	jank_solution = empty((jank_time.size, initial_state.size))
+	jank_time[0], jank_solution[0] = 0, initial_state
 	for i in range(num_steps):
-		t, new_states = simulate_diffusion(jank_solution[-1], step_size)
-		jank_time = concatenate([jank_time, jank_time[-1] + t])
-		jank_solution = concatenate([jank_solution, new_states])
-		_, new_states = simulate_growth(jank_solution[-1], step_size)
-		jank_time = concatenate([jank_time, jank_time[-1:]])
-		jank_solution = concatenate([jank_solution, new_states[-1:]])
+		start = i*(samples + 1)
+		t, new_states = simulate_diffusion(jank_solution[start], step_size)
+		jank_time[start + 1:start + 1 + samples] = jank_time[start] + t
+		jank_solution[start + 1:start + 1 + samples] = new_states
+		_, new_states = simulate_growth(jank_solution[start + samples], step_size)
+		jank_time[start + 1 + samples] = jank_time[start + samples]
+		jank_solution[start + 1 + samples] = new_states[-1]
 	staggered_jank_time = jank_time[:, newaxis] + arange(-3, 1)[newaxis, :]*5
 
-	true_time = array([0])
-	true_solution = expand_dims(initial_state, axis=0)
-	for i in range(num_steps):
-		t, new_states = simulate_growth_and_diffusion(true_solution[-1], step_size)
-		true_time = concatenate([true_time, true_time[-1] + t])
-		true_solution = concatenate([true_solution, new_states])
+	true_time, true_solution = simulate_trajectory(initial_state, step_size, num_steps, [ɣ_A, ɣ_B, ɣ_C, ɣ_D], k)
 
 	plt.figure()
 	plt.plot(staggered_jank_time, jank_solution, "--")
@@ -50,39 +58,80 @@ def main():
 	plt.show()
 
 
+def summarize_ensemble(initial_state, step_size, num_steps, growth_rates, k, size):
+	# run a bunch of civilizations with rates randomized about the given ones all at once and describe where they end up,
+	# streaming through the trajectory rather than storing it
+	initial_state = asarray(initial_state, dtype=float)
+	num_tiers = initial_state.size
+	rng = default_rng()
+	growth_rates = asarray(growth_rates, dtype=float)*rng.lognormal(0, RATE_SPREAD, (size, num_tiers))
+	diffusion_rates = k*rng.lognormal(0, RATE_SPREAD, size)
+	widest_gap = zeros(size)
+	for t, state in evolve(broadcast_to(initial_state, (size, num_tiers)), step_size*num_steps, num_steps*SAMPLES_PER_STEP,
+	                       growth_rates, diffusion_rates):
+		widest_gap = maximum(widest_gap, state[:, 0] - state[:, -1])
+	print(f"after {t:.0f} years, across {size} civilizations:")
+	for i in range(num_tiers):
+		low, median, high = percentile(state[:, i], [5, 50, 95])
+		print(f"  tier {chr(ord('A') + i)}: {mean(state[:, i]):.3f} ± {std(state[:, i]):.3f} (median {median:.3f}, 90% between {low:.3f} and {high:.3f})")
+	gap = state[:, 0] - state[:, -1]
+	print(f"  the gap between the top and bottom tiers is {mean(gap):.3f} ± {std(gap):.3f}, and was at most {mean(widest_gap):.3f} ± {std(widest_gap):.3f}")
+
+
+def simulate_trajectory(initial_state, step_size, num_steps, growth_rates, k):
+	# run it for several steps in a row, writing into one preallocated (time, ..., tier) buffer.  the rates can be
+	# batched along with the initial state to run a whole ensemble in one pass.
+	initial_state = asarray(initial_state, dtype=float)
+	time = empty(1 + num_steps*SAMPLES_PER_STEP)
+	states = None
+	for j, (t, state) in enumerate(evolve(initial_state, step_size*num_steps, num_steps*SAMPLES_PER_STEP, growth_rates, k)):
+		if states is None:
+			states = empty((time.size, *state.shape))
+			time[0], states[0] = 0, initial_state
+		time[j + 1], states[j + 1] = t, state
+	return time, states
+
+
 def simulate_growth(initial_state, duration):
-	T_A_0, T_B_0, T_C_0, T_D_0 = initial_state
-	t = linspace(0, duration)[1:]
-	T_A = T_A_0*exp(ɣ_A*t)
-	T_B = T_B_0*exp(ɣ_B*t)
-	T_C = T_C_0*exp(ɣ_C*t)
-	T_D = T_D_0*exp(ɣ_D*t)
-	return t, stack([T_A, T_B, T_C, T_D], axis=1)
+	return simulate_tiers(initial_state, duration, [ɣ_A, ɣ_B, ɣ_C, ɣ_D], 0)
 
 
 def simulate_diffusion(initial_state, duration):
-	T_A_0, T_B_0, T_C_0, T_D_0 = initial_state
-	t = linspace(0, duration)[1:]
-	T_A = full(t.shape, T_A_0)
-	T_B = T_A + (T_B_0 - T_A)*exp(-k*t)
-	T_C = T_A + (T_B_0*exp(-k*t) - T_A*exp(-k*t))*k*t + T_C_0*exp(-k*t) - T_A_0*exp(-k*t)
-	T_D = T_A + (((T_B_0 - T_A_0)*k*t/2 + T_C_0 - T_A_0)*k*t + T_D_0 - T_A_0)*exp(-k*t)
-	return t, stack([T_A, T_B, T_C, T_D], axis=1)
+	return simulate_tiers(initial_state, duration, zeros(4), k)
 
 
 def simulate_growth_and_diffusion(initial_state, duration):
-	T_A_0, T_B_0, T_C_0, T_D_0 = initial_state
-	t = linspace(0, duration)[1:]
-	τ = k*t
-	λA = ɣ_A/k
-	λB = ɣ_B/k - 1
-	λC = ɣ_C/k - 1
-	λD = ɣ_D/k - 1
-	T_A = T_A_0*exp(λA*τ)
-	T_B = T_B_0*exp(λB*τ) + T_A_0*(exp(λA*τ) - exp(λB*τ))/(λA - λB)
-	T_C = T_C_0*exp(λC*τ) + T_B_0*(exp(λB*τ) - exp(λC*τ))/(λB - λC) + T_A_0*((exp(λA*τ) - exp(λC*τ))/(λA - λC) - (exp(λB*τ) - exp(λC*τ))/(λB - λC))/(λA - λB)
-	T_D = T_D_0*exp(λD*τ) + T_C_0*(exp(λC*τ) - exp(λD*τ))/(λC - λD) + T_B_0*((exp(λB*τ) - exp(λD*τ))/(λB - λD) - (exp(λC*τ) - exp(λD*τ))/(λC - λD))/(λB - λC) + T_A_0*(((exp(λA*τ) - exp(λD*τ))/(λA - λD) - (exp(λC*τ) - exp(λD*τ))/(λC - λD))/(λA - λC) - ((exp(λB*τ) - exp(λD*τ))/(λB - λD) - (exp(λC*τ) - exp(λD*τ))/(λC - λD))/(λB - λC))/(λA - λB)
-	return t, stack([T_A, T_B, T_C, T_D], axis=1)
+	return simulate_tiers(initial_state, duration, [ɣ_A, ɣ_B, ɣ_C, ɣ_D], k)
+
+
+def simulate_tiers(initial_state, duration, growth_rates, k):
+	# evolve any number of tiers (such as the ages in resources/tech_tree.ts), each growing at its own rate and
+	# diffusing toward the one above it.  initial_state can be (N,) or (..., N) for a batch of civilizations, as can the
+	# growth rates (with k batched to match), and the result is (..., T, N) for T times.
+	t = linspace(0, duration, SAMPLES_PER_STEP + 1)[1:]
+	states = None
+	for j, (_, state) in enumerate(evolve(initial_state, duration, t.size, growth_rates, k)):
+		if states is None:
+			states = empty((*state.shape[:-1], t.size, state.shape[-1]))
+		states[..., j, :] = state
+	return t, states
+
+
+def evolve(initial_state, duration, num_samples, growth_rates, k):
+	# yield the time and the state of every tier at num_samples evenly spaced times, without keeping the history
+	growth_rates = asarray(growth_rates, dtype=float)
+	k = asarray(k, dtype=float)[..., newaxis]
+	n = growth_rates.shape[-1]
+	# dT/dt is the bidiagonal operator times T, so T(t) is its matrix exponential times T(0), which (unlike
+	# eigendecomposing it) is well-behaved when two tiers have the same rate
+	operator = zeros((*broadcast_shapes(growth_rates.shape[:-1], k.shape[:-1]), n, n))
+	operator[..., arange(n), arange(n)] = growth_rates - k*(arange(n) > 0)
+	operator[..., arange(1, n), arange(n - 1)] = k
+	propagator = expm(duration/num_samples*operator) # the samples are evenly spaced, so one exponential covers every interval
+	state = asarray(initial_state, dtype=float)
+	for j in range(1, num_samples + 1):
+		state = einsum("...ij,...j->...i", propagator, state)
+		yield duration*j/num_samples, state
 
 
 if __name__ == "__main__":